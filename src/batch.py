@@ -0,0 +1,126 @@
+"""
+Headless batch runner of MultiAgentSystem.process_request.
+
+Reads a JSONL file of requests, processes them with a bounded pool of workers that share
+one MultiAgentSystem (so the FMP, report and agent caches, the symbol index and the LLM
+rate limiter are shared too) and appends each result with its metrics to a JSONL file as
+soon as it finishes. Prints the throughput and a summary of the errors at the end.
+
+    python src/batch.py --input requests.jsonl --workers 4
+    python src/batch.py --input data/batch/morning.jsonl --output data/batch/morning_results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+from process.corpus import load_corpus, percentile
+
+load_dotenv()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch analysis of a JSONL file of requests")
+    parser.add_argument("--input", required=True,
+                        help="JSONL file, one request per line with 'user_input' (or 'body') and an optional 'request_id'")
+    parser.add_argument("--output", default=None,
+                        help="Where to write the results, defaults to data/batch/results_<timestamp>.jsonl")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BATCH_MAX_WORKERS", 4)),
+                        help="Requests processed at the same time")
+    parser.add_argument("--mode", choices=["replay", "record", "live"], default=None,
+                        help="Service mode, defaults to SERVICE_MODE")
+    return parser.parse_args()
+
+
+def process(multi_agent_system, request):
+    """
+    Processes one request, errors are returned in the record instead of raised.
+    """
+    from process.metrics import RequestMetrics
+
+    metrics = RequestMetrics(request_id = request["request_id"])
+    start = time.perf_counter()
+    record = {"request_id": request["request_id"], "user_input": request["user_input"]}
+    try:
+        result = multi_agent_system.process_request(user_input = request["user_input"], metrics = metrics)
+        if metrics.status == "ok":
+            record.update({"status": "ok", "result": str(result)})
+        else:
+            # Rejected by the router or no report, the router explanation is kept as the error
+            record.update({"status": "error", "error": f"{metrics.status}: {metrics.error}"})
+    except Exception as error:
+        record.update({"status": "error", "error": f"{type(error).__name__}: {error}"})
+    record["wall_seconds"] = time.perf_counter() - start
+    record["metrics"] = metrics.to_dict()
+    return record
+
+
+def print_summary(records, seconds):
+    errors = [record for record in records if record["status"] == "error"]
+    walls = [record["wall_seconds"] for record in records if record["status"] == "ok"]
+    cost = sum(record["metrics"]["usage"]["cost"] for record in records)
+    tokens = sum(record["metrics"]["usage"]["prompt_tokens"] + record["metrics"]["usage"]["completion_tokens"] for record in records)
+
+    print(f"Requests: {len(records)}  Succeeded: {len(records) - len(errors)}  Errors: {len(errors)}")
+    print(f"Elapsed: {seconds:.1f}s  Throughput: {len(records) / seconds * 60 if seconds else 0.0:.2f} requests/min")
+    if walls:
+        print(f"Latency per request: p50 {percentile(walls, 50):.1f}s  p90 {percentile(walls, 90):.1f}s  max {max(walls):.1f}s")
+    print(f"Tokens: {tokens}  Cost: USD {cost:.4f}")
+
+    if errors:
+        kinds = {}
+        for record in errors:
+            kind = record["error"].split(":", 1)[0]
+            kinds.setdefault(kind, []).append(record["request_id"])
+        print("\nErrors:")
+        for kind, request_ids in sorted(kinds.items(), key=lambda item: -len(item[1])):
+            shown = ", ".join(str(request_id) for request_id in request_ids[:5])
+            more = f" (+{len(request_ids) - 5} more)" if len(request_ids) > 5 else ""
+            print(f"  {kind}: {len(request_ids)}  [{shown}{more}]")
+
+
+def main():
+    args = parse_args()
+
+    # Must be set before the pipeline modules read their configuration
+    if args.mode:
+        os.environ["SERVICE_MODE"] = args.mode
+
+    from process.multi_agents import MultiAgentSystem
+
+    multi_agent_system = MultiAgentSystem(
+        azure_endpoint = f'{os.getenv("AZURE_OPENAI_ENDPOINT")}gpt-4o/chat/completions?api-version={os.getenv("AZURE_OPENAI_VERSION")}',
+        azure_key = os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version = os.getenv("AZURE_OPENAI_VERSION")
+    )
+
+    requests = load_corpus(args.input)
+    output = args.output or os.path.join("data", "batch", f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    records = []
+    start = time.perf_counter()
+    with open(output, "w", encoding="utf-8") as file, ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(process, multi_agent_system, request) for request in requests]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            # Written as they finish, a partial run keeps the results obtained so far
+            file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            file.flush()
+            print(f"[{len(records)}/{len(requests)}] {record['request_id']}: {record['status']} in {record['wall_seconds']:.1f}s")
+    seconds = time.perf_counter() - start
+
+    print()
+    print_summary(records, seconds)
+    print(f"Results saved to {output}")
+
+    return 1 if records and all(record["status"] == "error" for record in records) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark of MultiAgentSystem.process_request.
+
+Drives a fixed corpus of questions through the whole pipeline and reports latency
+percentiles and tokens per stage (routing, FMP fetch, key extraction, LLM preprocess, key
+cleanup and setup of each agent, each agent run, QA and summary) plus peak RSS. Results are saved as JSON so
+two versions can be compared with --compare.
+
+By default the services are replayed from fixtures (SERVICE_MODE=replay), record them
+once with --mode record:
+    python src/benchmark.py --mode record
+    python src/benchmark.py --repeat 3 --output data/benchmarks/results.json
+    python src/benchmark.py --compare data/benchmarks/results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+from process.corpus import load_corpus, percentile
+
+load_dotenv()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the multi-agent pipeline")
+    parser.add_argument("--corpus", default=os.path.join("data", "benchmarks", "questions.jsonl"),
+                        help="JSONL file, one request per line with 'user_input' (or 'body')")
+    parser.add_argument("--output", default=None,
+                        help="Where to save the results, defaults to data/benchmarks/results_<timestamp>.json")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the whole corpus is processed")
+    parser.add_argument("--mode", choices=["replay", "record", "live"], default="replay",
+                        help="Service mode, see SERVICE_MODE")
+    parser.add_argument("--with-cache", action="store_true",
+                        help="Keep the persistent caches enabled (FMP responses, routing, key cleanup decisions, "
+                             "agent outputs and reports), disabled by default so every run does the whole work")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+    return parser.parse_args()
+
+
+def summarize(runs):
+    stages = {}
+    for run in runs:
+        for name, stage in run.get("stages", {}).items():
+            stages.setdefault(name, {"seconds": [], "tokens": []})
+            stages[name]["seconds"].append(stage["seconds"])
+            stages[name]["tokens"].append(stage["tokens"])
+    totals = [run["total_seconds"] for run in runs if run.get("total_seconds") is not None]
+    if totals:
+        stages["total"] = {"seconds": totals, "tokens": [sum(s["tokens"] for s in run["stages"].values()) for run in runs if "stages" in run]}
+
+    summary = {}
+    for name, values in stages.items():
+        seconds = values["seconds"]
+        summary[name] = {
+            "count": len(seconds),
+            "mean": sum(seconds) / len(seconds),
+            "p50": percentile(seconds, 50),
+            "p90": percentile(seconds, 90),
+            "p99": percentile(seconds, 99),
+            "max": max(seconds),
+            "tokens_mean": sum(values["tokens"]) / len(values["tokens"]) if values["tokens"] else 0
+        }
+    return summary
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_summary(summary, previous = None):
+    header = f"{'stage':<28}{'n':>4}{'p50 (s)':>10}{'p90 (s)':>10}{'p99 (s)':>10}{'tokens':>10}"
+    if previous:
+        header += f"{'p50 before':>12}{'delta':>9}"
+    print(header)
+    for name, stage in summary.items():
+        line = f"{name:<28}{stage['count']:>4}{stage['p50']:>10.3f}{stage['p90']:>10.3f}{stage['p99']:>10.3f}{stage['tokens_mean']:>10.0f}"
+        if previous and name in previous:
+            before = previous[name]["p50"]
+            delta = (stage["p50"] - before) / before * 100 if before else 0.0
+            line += f"{before:>12.3f}{delta:>8.1f}%"
+        print(line)
+
+
+def main():
+    args = parse_args()
+
+    # Must be set before the pipeline modules read their configuration
+    os.environ["SERVICE_MODE"] = args.mode
+    if not args.with_cache:
+        for variable in ("FMP_CACHE_ENABLED", "ROUTING_CACHE_ENABLED", "KEY_CLEANUP_CACHE_ENABLED",
+                         "AGENT_MEMO_ENABLED", "REPORT_CACHE_ENABLED"):
+            os.environ[variable] = "false"
+        # Thread-only coalescing, results published for other processes are not read back
+        os.environ["SINGLE_FLIGHT_DIR"] = ""
+
+    from process.multi_agents import MultiAgentSystem
+    from process.metrics import peak_rss_mb
+
+    multi_agent_system = MultiAgentSystem(
+        azure_endpoint = f'{os.getenv("AZURE_OPENAI_ENDPOINT")}gpt-4o/chat/completions?api-version={os.getenv("AZURE_OPENAI_VERSION")}',
+        azure_key = os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version = os.getenv("AZURE_OPENAI_VERSION")
+    )
+
+    corpus = load_corpus(args.corpus)
+    runs = []
+    for iteration in range(args.repeat):
+        for request in corpus:
+            start = time.perf_counter()
+            run = {"request_id": request["request_id"], "iteration": iteration}
+            try:
+                multi_agent_system.process_request(user_input = request["user_input"])
+                run.update(multi_agent_system.last_metrics.to_dict())
+            except Exception as error:
+                run.update({"error": f"{type(error).__name__}: {error}", "total_seconds": None})
+            run["wall_seconds"] = time.perf_counter() - start
+            runs.append(run)
+
+    results = {
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "corpus": args.corpus,
+        "errors": sum(1 for run in runs if "error" in run),
+        "peak_rss_mb": peak_rss_mb(),
+        "summary": summarize([run for run in runs if "error" not in run]),
+        "runs": runs
+    }
+
+    output = args.output or os.path.join("data", "benchmarks", f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4, ensure_ascii=False)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)["summary"]
+
+    print_summary(results["summary"], previous)
+    throttled = [run.get("throttle_seconds", 0.0) for run in runs if "error" not in run]
+    print(f"\nRequests: {len(runs)}  Errors: {results['errors']}  Peak RSS: {results['peak_rss_mb']} MB")
+    if throttled:
+        print(f"LLM throttling per request: mean {sum(throttled) / len(throttled):.2f}s  max {max(throttled):.2f}s")
+    queued = [run.get("queue_seconds", 0.0) for run in runs if "error" not in run]
+    if queued:
+        print(f"FMP quota wait per request: mean {sum(queued) / len(queued):.2f}s  max {max(queued):.2f}s")
+    print(f"Results saved to {output}")
+
+    return 1 if results["errors"] == len(runs) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
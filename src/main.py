@@ -11,6 +11,16 @@ load_dotenv()
 
 logger = Logger()
 
+@st.cache_resource
+def get_multi_agent_system(azure_endpoint, azure_key, api_version):
+    # One instance per process, clients, connection pools, caches and agent templates
+    # are shared by every session and request
+    return MultiAgentSystem(
+        azure_endpoint = azure_endpoint,
+        azure_key = azure_key,
+        api_version = api_version
+    )
+
 # Usage
 def main(user_input):
     llm_endpoint = {
@@ -27,17 +37,38 @@ def main(user_input):
         module_name = "main()"
     )
 
-    multi_agent_system = MultiAgentSystem(
+    multi_agent_system = get_multi_agent_system(
         azure_endpoint = f'{llm_endpoint["endpoint"]}{llm_endpoint["model"]["gpt-4o"]}/chat/completions?api-version={llm_endpoint["version"]}',
         azure_key = os.getenv("AZURE_OPENAI_API_KEY"),
         api_version= os.getenv("AZURE_OPENAI_VERSION")
     )
  
-    result = multi_agent_system.process_request(
-        user_input = user_input
-    )
+    if os.getenv("STREAM_REPORT", "true").lower() != "true":
+        result = multi_agent_system.process_request(
+            user_input = user_input
+        )
+
+        st.markdown(result, unsafe_allow_html=True)
+        return
+
+    # Stage progress and the report are shown as they arrive
+    status = st.status("Processing request...", expanded=True)
+    report = st.empty()
+    streamed = ""
+    result = ""
+    for event in multi_agent_system.process_request_stream(user_input = user_input):
+        if event["type"] == "stage" and event["status"] == "finished":
+            status.write(f"✅ {event['stage']} ({event['seconds']:.1f}s)")
+        elif event["type"] == "stage":
+            status.write(f"⏳ {event['stage']}...")
+        elif event["type"] == "token":
+            streamed += event["text"]
+            report.markdown(streamed, unsafe_allow_html=True)
+        elif event["type"] == "result":
+            result = event["text"]
 
-    st.markdown(result, unsafe_allow_html=True)
+    status.update(label="Done", state="complete", expanded=False)
+    report.markdown(result, unsafe_allow_html=True)
 
 if __name__ == "__main__":
 
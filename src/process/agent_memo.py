@@ -0,0 +1,75 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+from process.cache import DiskCache
+from process.logger import Logger
+
+load_dotenv()
+
+logger = Logger()
+
+
+class AgentMemo:
+    """
+    Memoized outputs of the specialist agents.
+
+    An output is identified by the agent, the model, a hash of each of its input endpoints and
+    a hash of its prompt (role, goal, backstory and task, which contains the serialized data),
+    so a request only re-runs the agents whose inputs changed and reuses the other outputs.
+
+    Attributes:
+        store (DiskCache): Where the outputs are kept.
+        ttl (float): Seconds an output is reused.
+    """
+    def __init__(self, store, ttl = 7 * 24 * 60 * 60):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def key(self, agent_name, model, data, agent, task):
+        """
+        Args:
+            agent_name (str): Specialist name, as given by the router, e.g. 'Financial'.
+            model (str): Model used by the agent.
+            data (dict): Endpoint name to the cleaned response given to the agent.
+            agent (Agent): The specialist agent.
+            task (Task): Its task.
+
+        Returns:
+            str: The output key.
+        """
+        return DiskCache.make_key(
+            "agent_output",
+            agent_name,
+            model,
+            {endpoint: DiskCache.make_key(payload) for endpoint, payload in data.items()},
+            DiskCache.make_key(agent.role, agent.goal, agent.backstory, task.description, task.expected_output)
+        )
+
+    def get(self, key):
+        output = self.store.get(key)
+        with self._lock:
+            self.stats["hits" if output is not None else "misses"] += 1
+        return output
+
+    def set(self, key, output):
+        self.store.set(key, output, self.ttl)
+
+    def clear(self):
+        self.store.clear()
+        logger.log_info(
+            message = "Memoized agent outputs cleared",
+            module_name = "AgentMemo.clear"
+        )
+
+
+# Shared by every session
+agent_memo = AgentMemo(
+    store = DiskCache(
+        os.getenv("AGENT_MEMO_DIR", os.path.join(os.getcwd(), "data", "cache", "agent_outputs")),
+        max_bytes = float(os.getenv("AGENT_MEMO_MAX_MB", 64)) * 1024 * 1024
+    ),
+    ttl = float(os.getenv("AGENT_MEMO_TTL_HOURS", 168)) * 60 * 60
+)
@@ -1,9 +1,18 @@
 import time
 import os
+import inspect
+import hashlib
+import threading
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew
 from crewai import LLM
-from tiktoken import encoding_for_model
+
+from process.endpoint import AGENT_ENDPOINTS
+from process.metrics import current_metrics
+from process.rate_limit import llm_limiter, throttle_llm
+from process.record_replay import get_mode, wrap_llm
+from process.task_data import TaskDataSerializer, get_encoding
+from process.usage import usage_ledger, collect_task_usage
 
 load_dotenv()
 """
@@ -58,8 +67,44 @@ class AgentFactory:
             api_key=api_key,
             max_tokens=350
         )
+        # Waits only when the shared Azure OpenAI budget is exhausted
+        self.conf = throttle_llm(self.conf, llm_limiter)
+        if get_mode() != "live":
+            self.conf = wrap_llm(self.conf)
         self.allow_delegation = False
+        self.compact_task_data = os.getenv("COMPACT_TASK_DATA", "true").lower() == "true"
+        self.serializer = TaskDataSerializer()
+        self.templates = {}
+        self._templates_lock = threading.Lock()
+
+    def from_template(self, name, build):
+        """
+        Returns a copy of the agent template `name`, built with `build` the first time.
+        Agents keep per-crew state, so every request gets its own copy of the shared template.
+        """
+        with self._templates_lock:
+            if name not in self.templates:
+                self.templates[name] = build()
+        return self.templates[name].copy()
 
+    @property
+    def prompt_version(self):
+        """
+        Identifies the prompts and how the endpoint data is rendered in them, part of the cached report keys.
+        """
+        return f"{PROMPT_VERSION}-{int(self.compact_task_data)}-{self.serializer.token_budget}"
+
+    def task_data(self, agent_name, data):
+        """
+        Returns the endpoint data of an agent as compact tables within its token budget,
+        or the responses unchanged when COMPACT_TASK_DATA is disabled.
+        """
+        if not self.compact_task_data:
+            return data
+        return self.serializer.serialize(
+            agent_name,
+            {endpoint: data[endpoint] for endpoint in AGENT_ENDPOINTS[agent_name]}
+        )
 
     def get_agent_class(self, agent_name):
         agent_mapping = {
@@ -72,7 +117,8 @@ class AgentFactory:
         return agent_mapping.get(agent_name)
 
     def FinancialAgent(self, company, data):
-        financial_agent = Agent(
+        data = self.task_data("Financial", data)
+        financial_agent = self.from_template("financial_agent", lambda: Agent(
             role = 'Financial Analyst',
             goal = f"Write an insightful and factually accurate financial analysis",
             backstory = """
@@ -82,7 +128,7 @@ class AgentFactory:
             """,
             llm = self.conf,
             allow_delegation = self.allow_delegation,
-        )
+        ))
         financial_task = Task(
             description = f"""
                 Your task is to analyze the following financial information that will be provided to you. 
@@ -106,7 +152,8 @@ class AgentFactory:
 
 
     def RiskAgent(self, company, data):
-        risk_agent = Agent(
+        data = self.task_data("Risk", data)
+        risk_agent = self.from_template("risk_agent", lambda: Agent(
             role = 'Risk Analyst',
             goal = f"""
             Write an insightful and factually accurrate risk analysis
@@ -119,7 +166,7 @@ class AgentFactory:
             """,
             llm = self.conf,
             allow_delegation = self.allow_delegation,
-        )
+        ))
         risk_task = Task(
             description = f"""
                 Your task is to analyze the following financial information with a focus on identifying risks. 
@@ -140,7 +187,8 @@ class AgentFactory:
         return risk_agent, risk_task
 
     def InvestmentAgent(self, company, data):
-        investment_agent = Agent(
+        data = self.task_data("Investment", data)
+        investment_agent = self.from_template("investment_agent", lambda: Agent(
             role = 'Investment Analyst',
             goal = f" Write an insightful and factually accurrate investment analysis",
             backstory = """
@@ -151,7 +199,7 @@ class AgentFactory:
             """,
             llm = self.conf,
             allow_delegation = self.allow_delegation,
-        )
+        ))
         investment_task = Task(
             description = f"""
                 Your task is to analyze the following financial information with a focus on identifying investment opportunities. 
@@ -174,7 +222,8 @@ class AgentFactory:
         return investment_agent, investment_task
 
     def AccountingAgent(self, company, data):
-        accounting_agent = Agent(
+        data = self.task_data("Accounting", data)
+        accounting_agent = self.from_template("accounting_agent", lambda: Agent(
             role = 'Accounting Specialist Analyst',
             goal = f" Write an insightful and factually accurrate accounting analysis",
             backstory = """
@@ -185,7 +234,7 @@ class AgentFactory:
             """,
             llm = self.conf,
             allow_delegation = self.allow_delegation,
-        )
+        ))
         accounting_task = Task(
             description = f"""
                 Your task is to analyze the following accounting information that will be provided to you. 
@@ -208,7 +257,8 @@ class AgentFactory:
         return accounting_agent, accounting_task
 
     def LegalAgent(self, company, data):
-        legal_agent = Agent(
+        data = self.task_data("Legal", data)
+        legal_agent = self.from_template("legal_agent", lambda: Agent(
             role = 'Legal Compliance Expert Analyst',
             goal = f" Write an insightful and factually accurrate legal analysis",
             backstory = """
@@ -220,7 +270,7 @@ class AgentFactory:
             """,
             llm = self.conf,
             allow_delegation = self.allow_delegation,
-        )
+        ))
         legal_task = Task(
             description = f"""
                 Your task is to analyze the following information that will be provided to you. 
@@ -242,11 +292,13 @@ class AgentFactory:
         return legal_agent, legal_task
 
     def create_qa_agent(self, agents_type, tasks): 
+        # Static role and instructions first, the reviewed agents last, so the prompt prefix
+        # is the same for every request and the provider prompt cache applies
         qa_agent = Agent(
-            role=f'Quality Assurance Analyst for this types of agents: {", ".join(agents_type)}',
-            goal=f'Verify and improve quality of the respective {", ".join(agents_type)} analysis',
-            backstory=f'''
-            Expert in validating agents like {", ".join(agents_type)} analysis content. 
+            role='Quality Assurance Analyst for the specialist agents',
+            goal='Verify and improve quality of the analysis of each specialist agent',
+            backstory='''
+            Expert in validating financial, accounting, legal, risk and investment analysis content. 
             Ensures information is relevant, accurate, and properly formatted.
             ''',
             llm=self.conf
@@ -254,18 +306,20 @@ class AgentFactory:
         
         qa_task = Task(
             description=f'''
-            Review and validate the agents {", ".join(agents_type)} analysis.
+            Review and validate the analysis of the agents listed at the end.
 
             Requirements:
-            1. Content must be relevant to the agents {", ".join(agents_type)} analysis
+            1. Content must be relevant to the analysis of those agents
             2. Analysis must be clear and well-structured
             3. Remove any redundant or irrelevant information
             4. Ensure numerical data is properly contextualized
 
             Return only the high-quality, relevant content.
+
+            Agents: {", ".join(agents_type)}
             ''',
-            expected_output=f'''
-            High-quality {", ".join(agents_type)} analysis with:
+            expected_output='''
+            High-quality analysis of each agent with:
             - Relevant information only
             - Clear structure
             - Properly formatted numbers
@@ -299,7 +353,7 @@ class AgentFactory:
         summary_task = Task(
             description=f'''
             Avoid the creation of any Latex format, just focus in
-            create a Markdown report for {company} following these MANDATORY RULES:
+            create a Markdown report for the company given at the end following these MANDATORY RULES:
 
             NUMBER FORMATTING RULES:
             1. Format large numbers as ONE complete bold unit:
@@ -329,6 +383,8 @@ class AgentFactory:
             # Main Title
             ## Sections
             ### Subsections
+
+            Company: {company}
             ''',
             agent=summary_agent,
             context=tasks,
@@ -337,34 +393,104 @@ class AgentFactory:
         
         return summary_agent, summary_task
 
-    def create_crew(self, agents, tasks):
+    def task_messages(self, agent, task):
+        """
+        Chat messages that run `task` with `agent` outside of a crew, with the outputs of the
+        context tasks (already executed) appended, as CrewAI does.
+        """
+        context = "\n\n".join(
+            context_task.output.raw
+            for context_task in task.context or []
+            if context_task.output is not None
+        )
+        return [
+            {
+                "role": "system",
+                "content": f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"
+            },
+            {
+                "role": "user",
+                "content": f"{task.description}\n\nThis is the expected criteria for your final answer: {task.expected_output}\n\nThis is the context you're working with:\n{context}"
+            }
+        ]
+
+    def record_task_usage(self, usage, stage, seconds, metrics):
+        """
+        Records the prompt, completion and cached tokens collected for one task, then resets
+        `usage` for the next task of the crew.
+
+        Returns:
+            bool: False when no LLM call reported usage.
+        """
+        if not usage["calls"]:
+            return False
+        usage_ledger.record(
+            usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"],
+            seconds = seconds, stage = stage, model = self.conf.model,
+            source = "crew", metrics = metrics
+        )
+        for key in usage:
+            usage[key] = 0
+        return True
+
+    def create_crew(self, agents, tasks, stage_names = None):
         timing = []
         timing.append(time.time())
         token = []
-        self.encoding = encoding_for_model("gpt-4")
         outputs = []
+        metrics = current_metrics()
+        task_marks = [(time.time(), 0)]
+        # The crew runs its tasks in this context, one after the other
+        usage = collect_task_usage()
         
         
         def step_callback(formatted_answer):
             timing.append(time.time())
             outputs.append(formatted_answer.output)
 
-            if timing[-1] - timing[-2] < 15:
-                time.sleep(15)
-
-            tokens = len(self.encoding.encode(str(formatted_answer.output)))
+            tokens = len(get_encoding().encode(str(formatted_answer.output)))
             token.append(tokens)
+
+        def stage_name(index):
+            return stage_names[index] if stage_names and index < len(stage_names) else f"task:{index}"
+
+        def task_callback(task_output):
+            # Tasks run one after the other, each stage lasts from the previous task end
+            if metrics is None:
+                return
+            index = len(task_marks) - 1
+            name = stage_name(index)
+            started, first_step = task_marks[-1]
+            seconds = time.time() - started
+            metrics.record(name, seconds = seconds)
+            if not self.record_task_usage(usage, name, seconds, metrics):
+                # No usage reported (replayed calls), estimated from the step outputs
+                metrics.record(name, tokens = sum(token[first_step:]))
+            metrics.event(name, "finished", seconds)
+            task_marks.append((time.time(), len(token)))
+            if index + 1 < len(tasks):
+                metrics.event(stage_name(index + 1), "started")
         
         crew = Crew(
             agents=agents,
             tasks=tasks,
             manager_llm=self.conf,
             verbose=True,
-            step_callback=step_callback
+            step_callback=step_callback,
+            task_callback=task_callback
         )
+        # The crew is kicked off right away, its first task starts now
+        if metrics is not None and tasks:
+            metrics.event(stage_name(0), "started")
         
         return crew, timing, token, outputs
 
 
 
-        
\ No newline at end of file
+        
+
+
+# Changes whenever a prompt of the agents or the rendering of their data changes
+PROMPT_VERSION = hashlib.sha256(
+    (inspect.getsource(AgentFactory) + inspect.getsource(inspect.getmodule(TaskDataSerializer))).encode("utf-8")
+).hexdigest()[:16]
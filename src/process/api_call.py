@@ -1,29 +1,150 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from process.endpoint import EndpointBuilder
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from process.cache import DiskCache
+from process.endpoint import EndpointBuilder, ENDPOINT_REGISTRY
+from process.json_stream import parse_projected
 from process.logger import Logger
+from process.metrics import current_metrics
+from process.rate_limit import RequestScheduler
+from process.record_replay import RecordReplaySession, get_mode
+from process.single_flight import SingleFlight
+
+load_dotenv()
 
 logger = Logger()
 
+
+def is_error_payload(payload):
+    """
+    Whether a decoded response is an FMP error ({"Error Message": ...}) answered with status 200.
+    """
+    return isinstance(payload, dict) and "Error Message" in payload
+
+
+# Shared by every client in the process so concurrent sessions coalesce identical calls,
+# processes waiting on the lock read the response the leader published in the store
+single_flight = SingleFlight(
+    lock_dir = os.getenv("SINGLE_FLIGHT_DIR", os.path.join(os.getcwd(), "data", "cache", "locks")),
+    store = DiskCache(os.path.join(os.getcwd(), "data", "cache", "single_flight_fmp"), max_bytes = 64 * 1024 * 1024),
+    publish = lambda payload: not is_error_payload(payload)
+)
+
+# The plan quota is per API key, so every client in the process shares the same scheduler
+scheduler = RequestScheduler(
+    calls_per_minute = int(os.getenv("FMP_CALLS_PER_MINUTE", 300)),
+    max_retries = int(os.getenv("FMP_MAX_RETRIES", 4))
+)
+
 class FinancialModelingPrepAPI():
     """
     Client for interacting with the Financial Modeling Prep API.
     This class provides methods to build and retrieve data from various Financial Modeling Prep API endpoints.
     Attributes:
         build_endpoint (EndpointBuilder): An instance used to construct API endpoint URLs.
+        max_workers (int): Maximum number of endpoints fetched at the same time.
+        session (requests.Session): Shared keep-alive session used for every request.
+        cache (DiskCache): Persistent response cache, None disables caching.
+        scheduler (RequestScheduler): Rate limiter and retry policy for every API call.
+        batch_size (int): Maximum number of tickers per multi-symbol call.
+        timeout (float): Seconds to wait for the connection and for each read of a response.
     """
-    def __init__(self):
+    def __init__(self, max_workers = None, cache = None, batch_size = 50):
         """
-        Initializes the EndpointBuilder class.
-        Creates an EndpointBuilder instance for constructing API endpoint URLs.
+        Initializes the EndpointBuilder class and the shared HTTP session.
+        Creates an EndpointBuilder instance for constructing API endpoint URLs and a
+        requests.Session whose connection pool is sized to the concurrency limit.
+
+        Args:
+            max_workers (int, optional): Concurrency limit for endpoint fetching.
+                Defaults to the 'FMP_MAX_WORKERS' environment variable or 6.
+            cache (DiskCache, optional): Response cache. Defaults to a DiskCache in 'FMP_CACHE_DIR'
+                (data/cache/fmp) bounded by 'FMP_CACHE_MAX_MB', disabled when 'FMP_CACHE_ENABLED' is false.
+            batch_size (int, optional): Maximum number of tickers per multi-symbol call.
         """
         self.build_endpoint = EndpointBuilder()
+        self.max_workers = max(1, int(max_workers or os.getenv("FMP_MAX_WORKERS", 6)))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections = self.max_workers,
+            pool_maxsize = self.max_workers
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if get_mode() != "live":
+            self.session = RecordReplaySession(self.session)
+
+        if cache is None and os.getenv("FMP_CACHE_ENABLED", "true").lower() == "true":
+            cache = DiskCache(
+                directory = os.getenv("FMP_CACHE_DIR", os.path.join(os.getcwd(), "data", "cache", "fmp")),
+                max_bytes = int(os.getenv("FMP_CACHE_MAX_MB", 256)) * 1024 * 1024
+            )
+        self.cache = cache
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.timeout = float(os.getenv("FMP_TIMEOUT_SECONDS", 30))
+
+    def fetch_endpoint(self, url, cache_key = None, ttl = 0, queue_waits = None, discard = ()):
+        """
+        Retrieves a single API endpoint through the shared session.
+        Identical concurrent requests, from this or other worker processes, share one upstream call.
+        Args:
+            url (str): Fully constructed API endpoint URL.
+            cache_key (str, optional): Key used to store a successful response in the cache.
+            ttl (int, optional): Seconds the response stays in the cache.
+            queue_waits (list, optional): Collects the seconds spent waiting for quota.
+            discard (tuple, optional): Record keys dropped while the body is parsed.
+        Returns:
+            The decoded JSON response.
+        Raises:
+            requests.HTTPError: If the API still answers with an error status after the retries.
+        """
+        key = cache_key or DiskCache.make_key(url, sorted(discard))
+        return single_flight.do(key, lambda: self._request(url, cache_key, ttl, queue_waits, discard))
+
+    def _request(self, url, cache_key, ttl, queue_waits, discard):
+        if cache_key:
+            # Another process may have stored it while this one waited for the lock
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response, waited = self.scheduler.execute(lambda: self.session.get(url, stream = True, timeout = self.timeout))
+        if queue_waits is not None:
+            queue_waits.append(waited)
+
+        # Closed on every path so the connection goes back to the pool
+        with response:
+            if not response.ok:
+                logger.log_critical(
+                    message = f"There was an error with the API, status {response.status_code}",
+                    module_name = "FinancialModelingPrepAPI.fetch_endpoint"
+                )
+                response.raise_for_status()
+
+            # Stream the body so discarded fields are never materialized
+            response.raw.decode_content = True
+            payload = parse_projected(response.raw, discard = discard)
+
+        # Empty answers (unknown or newly listed tickers) are asked again next time
+        if cache_key and payload and not is_error_payload(payload):
+            self.cache.set(cache_key, payload, ttl)
+
+        return payload
 
     def get_endpoints_data(self, endpoints, ticker, limit, _from, to, query, exchange, company_name):
         """
-        Retrieves data from multiple API endpoints.
+        Retrieves data from multiple API endpoints concurrently.
         Args:
             endpoints (list): A list of endpoint names to retrieve data from.
             **kwargs: Variable keyword arguments to be passed to the endpoint URL construction.
+        Returns:
+            dict: Mapping of endpoint name to its JSON response, in the order of `endpoints`.
         """
 
         logger.log_info(
@@ -31,25 +152,154 @@ class FinancialModelingPrepAPI():
             module_name = "FinancialModelingPrepAPI.get_endpoints_data"
         )
 
+        params = {
+            "ticker": ticker,
+            "limit": limit,
+            "_from": _from,
+            "to": to,
+            "query": query,
+            "exchange": exchange,
+            "company_name": company_name
+        }
+
         responses = {}
+        pending = {}
+        for endpoint in endpoints:
+            spec = ENDPOINT_REGISTRY[endpoint]
+            cache_key, cached = self._cache_lookup(endpoint, params, spec.discard)
+            if cached is not None:
+                responses[endpoint] = cached
+                continue
+            pending[endpoint] = (self.build_endpoint.build(endpoint, **params), cache_key, spec.ttl, spec.discard)
+
+        logger.log_info(
+            message = f"{len(responses)} endpoints served from cache, {len(pending)} fetched from the API",
+            module_name = "FinancialModelingPrepAPI.get_endpoints_data"
+        )
+
+        responses.update(self._fetch_all(pending))
+
+        return {endpoint: responses[endpoint] for endpoint in endpoints}
+
+    def get_batch_endpoints_data(self, endpoints, tickers, limit = 365, _from = None, to = None):
+        """
+        Retrieves data from multiple API endpoints for multiple tickers.
+        Endpoints flagged as `batch` in ENDPOINT_REGISTRY are requested with FMP's comma-separated
+        multi-symbol form (up to `batch_size` tickers per call), every other endpoint is fanned out
+        concurrently one ticker at a time. Results populate the same cache as `get_endpoints_data`.
+        Args:
+            endpoints (list): Names of endpoints that take a ticker in their path.
+            tickers (list): Stock ticker symbols, case insensitive.
+            limit (int): Limit for historical data.
+            _from (str): Start date for historical data.
+            to (str): End date for historical data.
+        Returns:
+            dict: Mapping of upper-cased ticker to a `{endpoint: json}` dict, as returned by `get_endpoints_data`.
+        Raises:
+            ValueError: If an endpoint does not take a ticker.
+        """
+        without_ticker = [endpoint for endpoint in endpoints if ENDPOINT_REGISTRY[endpoint].path_param != "ticker"]
+        if without_ticker:
+            raise ValueError(f"Endpoints without a ticker cannot be batched: {', '.join(without_ticker)}")
+
+        logger.log_info(
+            message = f"Retrieving {len(endpoints)} endpoints for {len(tickers)} tickers",
+            module_name = "FinancialModelingPrepAPI.get_batch_endpoints_data"
+        )
+
+        # FMP answers with upper-case symbols, used to split multi-symbol responses
+        tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+        params = {"limit": limit, "_from": _from, "to": to}
+        results = {ticker: {} for ticker in tickers}
+        pending = {}
+        batches = {}
+
         for endpoint in endpoints:
-            url = self.build_endpoint.orchestrator(
-                endpoint, 
-                ticker, 
-                limit, 
-                _from,
-                to,
-                query,
-                exchange,
-                company_name
+            spec = ENDPOINT_REGISTRY[endpoint]
+            missing = []
+            for ticker in tickers:
+                cache_key, cached = self._cache_lookup(endpoint, dict(params, ticker = ticker), spec.discard)
+                if cached is not None:
+                    results[ticker][endpoint] = cached
+                elif spec.batch:
+                    missing.append(ticker)
+                else:
+                    url = self.build_endpoint.build(endpoint, **dict(params, ticker = ticker))
+                    pending[(ticker, endpoint)] = (url, cache_key, spec.ttl, spec.discard)
+
+            for start in range(0, len(missing), self.batch_size):
+                chunk = missing[start:start + self.batch_size]
+                url = self.build_endpoint.build(endpoint, **dict(params, ticker = ",".join(chunk)))
+                batches[(tuple(chunk), endpoint)] = (url, None, 0, spec.discard)
+
+        logger.log_info(
+            message = f"{len(batches)} multi-symbol calls and {len(pending)} single-symbol calls to the API",
+            module_name = "FinancialModelingPrepAPI.get_batch_endpoints_data"
+        )
+
+        for job_id, payload in self._fetch_all({**pending, **batches}).items():
+            ticker, endpoint = job_id
+            if job_id not in batches:
+                results[ticker][endpoint] = payload
+                continue
+
+            # Split the multi-symbol answer back into one list per ticker
+            spec = ENDPOINT_REGISTRY[endpoint]
+            by_symbol = {}
+            for item in payload if isinstance(payload, list) else []:
+                by_symbol.setdefault(item.get("symbol"), []).append(item)
+            for chunk_ticker in ticker:
+                records = by_symbol.get(chunk_ticker, [])
+                results[chunk_ticker][endpoint] = records
+                if self.cache is not None and spec.ttl and records:
+                    cache_key = self._cache_key(endpoint, dict(params, ticker = chunk_ticker), spec.discard)
+                    self.cache.set(cache_key, records, spec.ttl)
+
+        return {
+            ticker: {endpoint: responses[endpoint] for endpoint in endpoints}
+            for ticker, responses in results.items()
+        }
+
+    def _cache_key(self, endpoint, params, discard):
+        """
+        Returns the cache key of an endpoint request, the projection is part of the key.
+        """
+        return DiskCache.make_key(*ENDPOINT_REGISTRY[endpoint].cache_key(**params), sorted(discard))
+
+    def _cache_lookup(self, endpoint, params, discard = ()):
+        """
+        Returns the cache key of an endpoint request and its cached response, if any.
+        """
+        if self.cache is None or not ENDPOINT_REGISTRY[endpoint].ttl:
+            return None, None
+        cache_key = self._cache_key(endpoint, params, discard)
+        return cache_key, self.cache.get(cache_key)
+
+    def _fetch_all(self, jobs):
+        """
+        Fetches `{job_id: (url, cache_key, ttl, discard)}` concurrently and returns `{job_id: json}`.
+        """
+        queue_waits = []
+        responses = {}
+        if jobs:
+            workers = min(self.max_workers, len(jobs))
+            with ThreadPoolExecutor(max_workers = workers) as executor:
+                futures = {
+                    job_id: executor.submit(self.fetch_endpoint, url, cache_key, ttl, queue_waits, discard)
+                    for job_id, (url, cache_key, ttl, discard) in jobs.items()
+                }
+                for job_id, future in futures.items():
+                    responses[job_id] = future.result()
+
+        # Added to the request being processed, the client is shared by every request
+        queue_wait = sum(queue_waits)
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.add_queue_wait(queue_wait)
+        if queue_waits:
+            logger.log_info(
+                message = f"Waited {queue_wait:.2f}s for FMP quota across {len(queue_waits)} calls",
+                module_name = "FinancialModelingPrepAPI._fetch_all"
             )
-            response = requests.get(url)
-            # Check if a response contains any error, if it does you can use:
-            ## logger.log_critical(
-            #      message = "There was an error with the API"
-            #      module_name = ""FinancialModelingPrepAPI.get_endpoints_data""
-            # )
-            # raise ResponseError(f"{response['Error']}")
-            responses[endpoint] = response.json()
-
-        return responses
\ No newline at end of file
+
+        return responses
@@ -1,11 +1,43 @@
 import os
 import json
+from dotenv import load_dotenv
+
+import process.prompts as prompts
 from .utils import get_endpoint_mapping
+from process.cache import DiskCache
+from process.columnar import ColumnarTable, as_columnar
 from process.logger import Logger
 
+load_dotenv()
+
 logger = Logger()
 
-class PreprocessResponse:        
+class PreprocessResponse:
+    def __init__(self, decisions = None):
+        """
+        Args:
+            decisions (DiskCache, optional): Persistent memo of the LLM key cleanup decisions.
+                Defaults to a DiskCache in data/cache/key_cleanup whose entries expire after
+                'KEY_CLEANUP_TTL_DAYS' (30) days. Not used when 'KEY_CLEANUP_CACHE_ENABLED' is false.
+        """
+        self.decisions = decisions or DiskCache(
+            os.path.join(os.getcwd(), "data", "cache", "key_cleanup"),
+            max_bytes = 16 * 1024 * 1024
+        )
+        self.decisions_ttl = float(os.getenv("KEY_CLEANUP_TTL_DAYS", 30)) * 24 * 60 * 60
+        self.reuse_decisions = os.getenv("KEY_CLEANUP_CACHE_ENABLED", "true").lower() == "true"
+
+    def to_columnar(self, api_responses):
+        logger.log_info(
+            message = "Packing API responses into columnar tables",
+            module_name = "PreprocessResponse.to_columnar"
+        )
+
+        return {
+            endpoint: as_columnar(response)
+            for endpoint, response in api_responses.items()
+        }
+
     def json_exploration(self, user_input, agents, api_responses):
         def serialize_object(obj):
             """
@@ -57,9 +89,13 @@ class PreprocessResponse:
             to_send_llm[agent] = {}
             for endpoint in endpoint_mapping[agent]:
                 #print(api_responses[endpoint])
-                to_send_llm[agent][endpoint] = list(
-                    api_responses[endpoint][0].keys()
-                )
+                response = api_responses[endpoint]
+                if isinstance(response, ColumnarTable):
+                    to_send_llm[agent][endpoint] = response.fields
+                else:
+                    to_send_llm[agent][endpoint] = list(
+                        response[0].keys()
+                    )
 
         return to_send_llm
 
@@ -69,14 +105,61 @@ class PreprocessResponse:
             module_name = "PreprocessResponse.llm_preprocessing"
         )
 
-        # Send to LLM for preprocessing
-        result_key_cleanup = llm_router.preprocess_data(
-            data = key_cleanup,
-            process = "preprocess"
+        # Decisions only depend on the key schema of each endpoint, reuse the stored ones
+        result_key_cleanup = {}
+        pending = {}
+        schema_keys = {}
+        for agent, endpoints in key_cleanup.items():
+            result_key_cleanup[agent] = {}
+            for endpoint, keys in endpoints.items():
+                schema_key = self.schema_key(agent, endpoint, keys)
+                decision = self.decisions.get(schema_key) if self.reuse_decisions else None
+                if decision is not None:
+                    result_key_cleanup[agent][endpoint] = decision
+                else:
+                    pending.setdefault(agent, {})[endpoint] = keys
+                    schema_keys[(agent, endpoint)] = schema_key
+
+        logger.log_info(
+            message = f"{len(schema_keys)} endpoint schemas sent to the LLM, the rest reused stored decisions",
+            module_name = "PreprocessResponse.llm_preprocessing"
         )
 
+        if pending:
+            # Send to LLM for preprocessing
+            llm_key_cleanup = llm_router.preprocess_data(
+                data = pending,
+                process = "preprocess"
+            )
+            for (agent, endpoint), schema_key in schema_keys.items():
+                decision = (llm_key_cleanup.get(agent) or {}).get(endpoint)
+                if not isinstance(decision, list):
+                    # Left out by the LLM, every key is kept and the endpoint is asked again next time
+                    logger.log_warning(
+                        message = f"No key cleanup decision for {agent}/{endpoint}, keeping every key",
+                        module_name = "PreprocessResponse.llm_preprocessing"
+                    )
+                    result_key_cleanup[agent][endpoint] = []
+                    continue
+                result_key_cleanup[agent][endpoint] = decision
+                if self.reuse_decisions:
+                    self.decisions.set(schema_key, decision, self.decisions_ttl)
+
         return result_key_cleanup 
 
+    def schema_key(self, agent, endpoint, keys):
+        """
+        Identifies a key cleanup decision: agent, endpoint, sorted key schema, model and prompt.
+        """
+        return DiskCache.make_key(
+            "key_cleanup",
+            agent,
+            endpoint,
+            sorted(keys),
+            os.getenv("MODEL"),
+            DiskCache.make_key(prompts.sys_preprocess_data)
+        )
+
     def json_key_cleanup(self, keys_to_discard, api_responses):
         logger.log_info(
             message = "JSON key cleanup based on LLM evaluation of necessary information",
@@ -95,6 +178,10 @@ class PreprocessResponse:
         for key, discard_list in eliminate_keys.items():
             # Check if the key exists in api_responses
             if key in api_responses:
+                # Columnar responses only drop the columns
+                if isinstance(api_responses[key], ColumnarTable):
+                    api_responses[key] = api_responses[key].drop(discard_list)
+                    continue
                 # Modify in-place using list comprehension
                 api_responses[key] = [
                     {k: v for k, v in response.items() if k not in discard_list}
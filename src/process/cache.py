@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from process.logger import Logger
+
+logger = Logger()
+
+class DiskCache:
+    """
+    Persistent key-value cache stored as one JSON file per entry.
+
+    Entries carry their own expiration time, writes are atomic (temporary file + os.replace)
+    so concurrent readers never see partial files, and the directory is kept under
+    `max_bytes` by evicting the least recently used entries.
+
+    Attributes:
+        directory (str): Folder where the entries are stored.
+        max_bytes (int): Maximum size of the cache on disk.
+    """
+    def __init__(self, directory, max_bytes = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        # path -> size, ordered from least to most recently used
+        self._index = OrderedDict()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._index[path] = size
+        self._size = sum(self._index.values())
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Builds a stable cache key from JSON-serializable parts.
+
+        Returns:
+            str: SHA-256 hex digest of the parts.
+        """
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None when missing or expired.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+
+        try:
+            # mtime doubles as last access time for LRU eviction across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if path in self._index:
+                self._index.move_to_end(path)
+
+        return entry.get("value")
+
+    def set(self, key, value, ttl = None):
+        """
+        Stores `value` under `key`.
+
+        Args:
+            key (str): Cache key, usually built with `make_key`.
+            value: JSON-serializable value.
+            ttl (float, optional): Time to live in seconds, None never expires.
+        """
+        path = self._path(key)
+        entry = {
+            "expires_at": time.time() + ttl if ttl is not None else None,
+            "value": value
+        }
+
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump(entry, file, ensure_ascii=False)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._size -= self._index.pop(path, 0)
+            self._index[path] = size
+            self._size += size
+            self._evict()
+
+    def delete(self, key):
+        """
+        Removes `key` from the cache if present.
+        """
+        path = self._path(key)
+        with self._lock:
+            self._size -= self._index.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes every entry from the cache, including the ones written by other processes.
+        """
+        with self._lock:
+            paths = set(self._index)
+            self._index.clear()
+            self._size = 0
+        paths.update(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith(".json")
+        )
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        # Caller must hold self._lock
+        while self._size > self.max_bytes and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            logger.log_debug(
+                message = f"Evicted cache entry {os.path.basename(path)}",
+                module_name = "DiskCache._evict"
+            )
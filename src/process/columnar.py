@@ -0,0 +1,162 @@
+import sys
+from array import array
+
+
+def _column_from_values(values):
+    """
+    Packs a list of values in the most compact container available.
+    Floats go to array('d'), integers to array('q'), strings are interned, anything else
+    (None, booleans, integer/float mixes and other mixed types, nested objects) stays a plain
+    list, so every value keeps its type and its repr.
+    """
+    kinds = {type(value) for value in values}
+    if kinds == {float}:
+        return array("d", values)
+    if kinds == {int}:
+        try:
+            return array("q", values)
+        except OverflowError:
+            return list(values)
+    if kinds == {str}:
+        return [sys.intern(value) for value in values]
+    return list(values)
+
+
+class ColumnarTable:
+    """
+    Compact column-oriented container for a list of API records.
+
+    Each field is stored once with one array of values, instead of repeating every key in
+    every per-period dict. Dropping keys is a column drop. Rows are materialized on demand,
+    and `str()` renders the same text as the original list of dicts so prompts are unchanged:
+    records that lack some keys, or list them in another order, keep their own key layout.
+
+    Attributes:
+        columns (dict): Field name to its column (array or list), in the original key order.
+    """
+    def __init__(self, columns, length, layouts = None):
+        self.columns = columns
+        self._length = length
+        # Row index to its keys, only for the rows whose keys differ from `columns`
+        self._layouts = layouts or {}
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Builds a table from a list of dicts, missing keys are stored as None in the columns
+        and left out of the rows.
+
+        Args:
+            records (list): Records returned by the API.
+
+        Returns:
+            ColumnarTable: The packed records.
+        """
+        fields = {}
+        for record in records:
+            for key in record:
+                fields.setdefault(sys.intern(key), None)
+        columns = {
+            field: _column_from_values([record.get(field) for record in records])
+            for field in fields
+        }
+        order = tuple(fields)
+        layouts = {
+            index: tuple(record)
+            for index, record in enumerate(records)
+            if tuple(record) != order
+        }
+        return cls(columns, len(records), layouts)
+
+    @property
+    def fields(self):
+        return list(self.columns)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.slice(index.start, index.stop)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ColumnarTable index out of range")
+        layout = self._layouts.get(index)
+        if layout is not None:
+            return {field: self.columns[field][index] for field in layout}
+        return {field: column[index] for field, column in self.columns.items()}
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def __str__(self):
+        return str(self.to_records())
+
+    __repr__ = __str__
+
+    def column(self, field):
+        return self.columns[field]
+
+    def to_records(self):
+        """
+        Returns the table as a list of dicts, as received from the API.
+        """
+        return list(self)
+
+    def drop(self, fields):
+        """
+        Returns a table without the given fields.
+        """
+        fields = set(fields)
+        return ColumnarTable(
+            {field: column for field, column in self.columns.items() if field not in fields},
+            self._length,
+            {
+                index: tuple(field for field in layout if field not in fields)
+                for index, layout in self._layouts.items()
+            }
+        )
+
+    def select(self, fields):
+        """
+        Returns a table with only the given fields, in the given order.
+        """
+        fields = [field for field in fields if field in self.columns]
+        return ColumnarTable(
+            {field: self.columns[field] for field in fields},
+            self._length,
+            {
+                index: tuple(field for field in fields if field in layout)
+                for index, layout in self._layouts.items()
+            }
+        )
+
+    def slice(self, start = None, stop = None):
+        """
+        Returns a table with the rows in `[start:stop]`.
+        """
+        columns = {field: column[start:stop] for field, column in self.columns.items()}
+        indexes = range(self._length)[start:stop]
+        layouts = {
+            position: self._layouts[index]
+            for position, index in enumerate(indexes)
+            if index in self._layouts
+        }
+        return ColumnarTable(columns, len(indexes), layouts)
+
+
+def as_columnar(payload):
+    """
+    Converts an API response to a ColumnarTable when it is a list of records.
+
+    Args:
+        payload: Decoded API response.
+
+    Returns:
+        ColumnarTable for lists of dicts, otherwise the payload unchanged.
+    """
+    if isinstance(payload, list) and all(isinstance(item, dict) for item in payload):
+        return ColumnarTable.from_records(payload)
+    return payload
@@ -0,0 +1,33 @@
+import json
+import math
+
+
+def load_corpus(path):
+    """
+    Reads a JSONL file of requests, one object per line with 'user_input' (or 'body') and an
+    optional 'request_id', which defaults to the line position.
+
+    Returns:
+        list: Dicts with 'request_id' and 'user_input'.
+    """
+    corpus = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                request = json.loads(line)
+                corpus.append({
+                    "request_id": request.get("request_id", str(len(corpus))),
+                    "user_input": request.get("user_input") or request.get("body")
+                })
+    return corpus
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile, `q` between 0 and 100.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
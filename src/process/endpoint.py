@@ -3,317 +3,173 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-class EndpointBuilder():
+class EndpointSpec():
     """
-    Initializes the EndpointBuilder with Financial Modeling Prep API configuration.
+    Declarative description of a Financial Modeling Prep API endpoint.
 
     Attributes:
-        api_key (str): API key retrieved from environment variable 'FMP_API_KEY'.
-        base_url (str): Base URL for Financial Modeling Prep API.
-        api_version (str): API version used for endpoint construction.
+        operation (str): Endpoint name used across the pipeline (e.g. 'income-statement').
+        path (str): URL path after the API version, defaults to the operation.
+        path_param (str): Name of the parameter appended to the path (e.g. 'ticker'), if any.
+        query_params (tuple): Names of the request parameters sent as query string.
+        defaults (dict): Fixed query string values sent on every request.
+        agent (str): Agent that consumes this endpoint, if any.
+        schema (dict): Response schema hints, 'type' ('list' or 'object') and 'period_key'.
+        ttl (int): Seconds a response can be served from cache, 0 disables caching.
+        batch (bool): Whether the path parameter accepts comma-separated tickers.
+        discard (tuple): Record keys that are never useful to the agents, dropped while parsing.
     """
-    def __init__(self):
-        self.api_key =  os.getenv("FMP_API_KEY")
-        self.base_url = "https://financialmodelingprep.com/api"
-        self.api_version = "v3"
-        
-    def setup_endpoint(self, operation, **kwargs):
-        """
-        Constructs a URL endpoint for the Financial Modeling Prep API.
-
-        Args:
-            operation (str): The specific API operation to perform.
-            **kwargs: Flexible keyword arguments for endpoint customization.
-
-        Returns:
-            str: A fully constructed API endpoint URL.
-
-        Handling scenarios:
-        1. Single ticker or company name
-        2. Multiple parameters for non-search endpoints
-        3. Search ticker endpoint
-        4. Basic endpoint without parameters
-
-        Special handling:
-        - Converts '_from' parameter to 'from'
-        - Dynamically builds query parameters
-        - Appends API key to all endpoints
-        """
-        if len(kwargs.keys()) == 1:
-            if "ticker" in kwargs:
-                return f"{self.base_url}/{self.api_version}/{operation}/{kwargs['ticker']}?apikey={self.api_key}"
-            elif "company_name" in kwargs:
-                return f"{self.base_url}/{self.api_version}/{operation}/{kwargs['company_name']}?apikey={self.api_key}"
-
-        if kwargs and operation != "search-ticker":
-            count = 0
-            query_params = ''
-            for key, value in kwargs.items():
-                if count == 0:
-                    query_params += f"{value}?"
-                elif count > 0 and count < len(kwargs.keys()):
-                    extend_args = f"{key}={value}"
-                    if key == "_from":
-                        extend_args = f"from={value}"
-                    query_params += extend_args + "&"
-                count +=1
-            return f"{self.base_url}/{self.api_version}/{operation}/{query_params}apikey={self.api_key}"
-        elif kwargs and operation == "search-ticker":
-            query_params = ''
-            for key, value in kwargs.items():
-                extend_args = f"{key}={value}"
-                query_params += extend_args + "&"
-            return f"{self.base_url}/{self.api_version}/{operation}?{query_params}apikey={self.api_key}"
-        
-        return f"{self.base_url}/{self.api_version}/{operation}?apikey={self.api_key}"
-
-
-    def income_statement(self, ticker):
-        """
-        Generates the income statement endpoint URL for a specific ticker.
-
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual income statement.
-        """
-        period = "annual"
-        operation = "income-statement"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
-
-    def balance_sheet_statement(self, ticker):
-        """
-        Generates the balance sheet statement endpoint URL for a specific ticker.
-
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual balance sheet statement.
-        """
-        period = "annual"
-        operation = "balance-sheet-statement"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
-
-    def cash_flow_statement(self, ticker):
-        """
-        Generates the cash flow statement endpoint URL for a specific ticker.
+    def __init__(self, operation, path = None, path_param = None, query_params = (), defaults = None, agent = None, schema = None, ttl = 0, batch = False, discard = ()):
+        self.operation = operation
+        self.path = path or operation
+        self.path_param = path_param
+        self.query_params = tuple(query_params)
+        self.defaults = dict(defaults or {})
+        self.agent = agent
+        self.schema = dict(schema or {"type": "list"})
+        self.ttl = ttl
+        self.batch = batch
+        self.discard = tuple(discard)
 
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual cash flow statement.
+    def cache_key(self, **params):
         """
-        period = "annual"
-        operation = "cash-flow-statement"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
-
-    def cash_flow_statement_growth(self, ticker):
-        """
-        Generates the cash flow growth statement endpoint URL for a specific ticker.
+        Returns the parameters that identify a response of this endpoint.
 
         Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual cash flow growth statement.
-        """
-        period = "annual"
-        operation = "cash-flow-statement-growth"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
+            **params: Request parameters, only the ones used by the endpoint are kept.
 
-    def balance_sheet_statement_growth(self, ticker):
-        """
-        Generates the balance sheet growth statement endpoint URL for a specific ticker.
-
-        Args:
-            ticker (str): Stock ticker symbol.
         Returns:
-            str: Constructed API endpoint URL for annual balance sheet growth statement.
+            tuple: Operation name followed by the path and query parameter values.
         """
-        period = "annual"
-        operation = "balance-sheet-statement-growth"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
+        names = ((self.path_param,) if self.path_param else ()) + self.query_params
+        return (self.operation,) + tuple(params.get(name) for name in names)
 
-    def income_statement_growth(self, ticker):
+    def compile(self, base_url, api_key):
         """
-        Generates the income growth statement endpoint URL for a specific ticker.
+        Precompiles the URL template for this endpoint.
 
         Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual income growth statement.
-        """
-        period = "annual"
-        operation = "income-statement-growth"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
-
-    def profile(self, ticker):
-        """
-        Generates the company profile endpoint URL for a specific ticker.
+            base_url (str): Base URL including the API version.
+            api_key (str): Financial Modeling Prep API key.
 
-        Args:
-            ticker (str): Stock ticker symbol.
         Returns:
-            str: Constructed API endpoint URL for company profile.
-        """
-        operation = "profile"
-        return self.setup_endpoint(operation, ticker = ticker)
-        
-    def delisted_companies(self):
-        """
-        Generates the delisted companies endpoint URL.
-
-        Returns:
-            str: Constructed API endpoint URL for delisted companies.
-        """
-        operation = "delisted-companies"
-        return self.setup_endpoint(operation)
-
-    def stock_price_change(self, ticker):
-        """
-        Generates the stock price change endpoint URL for a specific ticker.
+            str: A `str.format` template where only the path parameter is left as a field,
+                the query parameters are appended by `EndpointBuilder.build` when they are set.
 
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for stock price change.
-        """
-        operation = "stock-price-change"
-        return self.setup_endpoint(operation, ticker = ticker)
-        
-    def discounted_cash_flow(self, ticker):
-        """
-        Generates the discounted cash flow endpoint URL for a specific ticker.
-
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for discounted cash flow.
-        """
-        operation = "discounted-cash-flow"
-        return self.setup_endpoint(operation, ticker = ticker)
-
-    def rating(self, ticker):
-        """
-        Generates the rating company endpoint URL for a specific ticker.
-
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for rating company.
-        """
-        operation = "rating"
-        return self.setup_endpoint(operation, ticker = ticker)
-
-    def historical_market_capitalization(self, ticker, limit, _from, to):
-        """
-        Generates endpoint URL for historical market capitalization data.
-
-        Args:
-            ticker (str): Stock ticker symbol.
-            limit (int): Number of historical records to retrieve.
-            _from (str): Start date for historical data.
-            to (str): End date for historical data.
-
-        Returns:
-            str: Constructed API endpoint URL for market capitalization history.
-        """
-        operation = "historical-market-capitalization"
-        return self.setup_endpoint(operation, ticker = ticker, limit = limit, _from = _from, to = to)
-
-    def search_ticker(self, query, exchange):
-        """
-        Generates endpoint URL for ticker search.
-
-        Args:
-            query (str): Search term for ticker.
-            exchange (str): Stock exchange to search.
-
-        Returns:
-            str: Constructed API endpoint URL for ticker search.
-        """
-        limit = 10
-        operation = "search-ticker"
-        return self.setup_endpoint(operation, query = query, limit = limit, exchange = exchange)
-        
-    def cik_search(self, company_name):
-        """
-        Generates endpoint URL for CIK (Central Index Key) search.
-
-        Args:
-            company_name (str): Name of the company to search.
-
-        Returns:
-            str: Constructed API endpoint URL for CIK search.
-        """
-        operation = "cik-search"
-        return self.setup_endpoint(operation, company_name = company_name)
-        
-    def financial_statement_symbol_lists(self):
-        """
-        Generates the financial symbol list statement endpoint URL.
-
-        Returns:
-            str: Constructed API endpoint URL for financial symbol list statement.
-        """
-        operation = "financial-statement-symbol-lists"
-        return self.setup_endpoint(operation)
+        Special handling:
+        - Fixed defaults are rendered once, the API key is appended to all endpoints
+        """
+        escape = lambda value: str(value).replace("{", "{{").replace("}", "}}")
+
+        url = f"{base_url}/{escape(self.path)}"
+        if self.path_param:
+            url += f"/{{{self.path_param}}}"
+
+        query = [f"{escape(key)}={escape(value)}" for key, value in self.defaults.items()]
+        query.append(f"apikey={escape(api_key)}")
+
+        return f"{url}?{'&'.join(query)}"
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Order matters: agent endpoints are listed in declaration order
+ENDPOINT_REGISTRY = {
+    spec.operation: spec for spec in (
+        # Financial
+        EndpointSpec("income-statement", path_param = "ticker", defaults = {"period": "annual"}, agent = "Financial", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY, discard = ("link", "finalLink")),
+        EndpointSpec("cash-flow-statement", path_param = "ticker", defaults = {"period": "annual"}, agent = "Financial", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY, discard = ("link", "finalLink")),
+        EndpointSpec("balance-sheet-statement", path_param = "ticker", defaults = {"period": "annual"}, agent = "Financial", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY, discard = ("link", "finalLink")),
+        # Accounting
+        EndpointSpec("cash-flow-statement-growth", path_param = "ticker", defaults = {"period": "annual"}, agent = "Accounting", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+        EndpointSpec("balance-sheet-statement-growth", path_param = "ticker", defaults = {"period": "annual"}, agent = "Accounting", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+        EndpointSpec("income-statement-growth", path_param = "ticker", defaults = {"period": "annual"}, agent = "Accounting", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+        # Legal
+        EndpointSpec("profile", path_param = "ticker", agent = "Legal", ttl = DAY, batch = True, discard = ("image", "defaultImage")),
+        # Risk
+        EndpointSpec("rating", path_param = "ticker", agent = "Risk", schema = {"type": "list", "period_key": "date"}, ttl = DAY, batch = True),
+        EndpointSpec("financial-growth", path_param = "ticker", defaults = {"period": "annual"}, agent = "Risk", schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+        # Investment
+        EndpointSpec("stock-price-change", path_param = "ticker", agent = "Investment", ttl = 5 * MINUTE, batch = True),
+        EndpointSpec("historical-market-capitalization", path_param = "ticker", query_params = ("limit", "_from", "to"), agent = "Investment", schema = {"type": "list", "period_key": "date"}, ttl = DAY),
+        EndpointSpec("discounted-cash-flow", path_param = "ticker", agent = "Investment", schema = {"type": "list", "period_key": "date"}, ttl = DAY, batch = True),
+        # Not bound to any agent
+        EndpointSpec("delisted-companies", ttl = DAY),
+        EndpointSpec("search-ticker", query_params = ("query", "exchange"), defaults = {"limit": 10}, ttl = DAY),
+        EndpointSpec("cik-search", path_param = "company_name", ttl = 30 * DAY),
+        EndpointSpec("financial-statement-symbol-lists", schema = {"type": "list"}, ttl = DAY),
+        EndpointSpec("stock-list", path = "stock/list", schema = {"type": "list"}, ttl = DAY),
+        EndpointSpec("key-metrics", path_param = "ticker", defaults = {"period": "annual"}, schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+        EndpointSpec("fmp", path = "fmp/articles", defaults = {"page": 0, "size": 5}, schema = {"type": "object"}, ttl = HOUR),
+        EndpointSpec("financial-statement-full-as-reported", path_param = "ticker", defaults = {"period": "annual", "limit": 50}, schema = {"type": "list", "period_key": "date"}, ttl = 30 * DAY),
+    )
+}
+
+AGENT_ENDPOINTS = {}
+for _spec in ENDPOINT_REGISTRY.values():
+    if _spec.agent:
+        AGENT_ENDPOINTS.setdefault(_spec.agent, []).append(_spec.operation)
+
+
+def get_agent_endpoints(agents):
+    """
+    Returns the endpoints consumed by the given agents, without duplicates.
 
-    def key_metrics(self, ticker):
-        """
-        Generates the company key metrics endpoint URL for a specific ticker.
+    Args:
+        agents (list): Agent names (e.g. ['Financial', 'Risk']).
 
-        Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual company key metrics.
-        """
-        period = "annual"
-        operation = "key-metrics"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
+    Returns:
+        list: Endpoint names in registry order for each agent.
+    """
+    endpoints = []
+    for agent in agents:
+        for endpoint in AGENT_ENDPOINTS.get(agent, []):
+            if endpoint not in endpoints:
+                endpoints.append(endpoint)
+    return endpoints
 
-    def fmp(self):
-        """
-        Generates endpoint URL for Financial Modeling Prep (FMP) articles.
 
-        Returns:
-            str: Constructed API endpoint URL for fetching FMP articles.
+class EndpointBuilder():
+    """
+    Initializes the EndpointBuilder with Financial Modeling Prep API configuration.
+    URL templates for every endpoint in ENDPOINT_REGISTRY are compiled once here,
+    building a URL afterwards is a single lookup plus `str.format`.
 
-        Details:
-            - Retrieves 5 articles 
-            - Starts from first page (page 0)
-        """
-        fmp = "articles"
-        page = 0
-        size = 5
-        operation = "fmp"
-        return self.setup_endpoint(operation, fmp = fmp, page = page, size = size)
+    Attributes:
+        api_key (str): API key retrieved from environment variable 'FMP_API_KEY'.
+        base_url (str): Base URL for Financial Modeling Prep API.
+        api_version (str): API version used for endpoint construction.
+        templates (dict): Precompiled URL template per endpoint name.
+    """
+    def __init__(self):
+        self.api_key =  os.getenv("FMP_API_KEY")
+        self.base_url = "https://financialmodelingprep.com/api"
+        self.api_version = "v3"
+        self.templates = {
+            operation: spec.compile(f"{self.base_url}/{self.api_version}", self.api_key)
+            for operation, spec in ENDPOINT_REGISTRY.items()
+        }
 
-    def financial_statement_full_as_reported(self, ticker):
+    def build(self, endpoint, **params):
         """
-        Generates the company financial statement as reported on API endpoint URL for a specific ticker.
+        Builds the URL of a registered endpoint.
 
         Args:
-            ticker (str): Stock ticker symbol.
-        Returns:
-            str: Constructed API endpoint URL for annual company financial statement as reported on API.
-        """
-        period = "annual"
-        limit = 50
-        operation = "financial-statement-full-as-reported"
-        return self.setup_endpoint(operation, ticker = ticker, period = period, limit = limit)
-
-    def financial_growth(self, ticker):
-        """
-        Generates the financial growth endpoint URL for a specific ticker.
+            endpoint (str): Endpoint name registered in ENDPOINT_REGISTRY.
+            **params: Request parameters (ticker, limit, _from, to, query, exchange, company_name),
+                parameters not used by the endpoint are ignored.
 
-        Args:
-            ticker (str): Stock ticker symbol.
         Returns:
-            str: Constructed API endpoint URL for annual financial growth.
+            str: A fully constructed API endpoint URL. Query parameters left as None are not
+                sent, '_from' is sent as 'from'.
         """
-        period = "annual"
-        operation = "financial-growth"
-        return self.setup_endpoint(operation, ticker = ticker, period = period)
+        url = self.templates[endpoint].format(**params)
+        for name in ENDPOINT_REGISTRY[endpoint].query_params:
+            if params.get(name) is not None:
+                url += f"&{name.lstrip('_')}={params[name]}"
+        return url
 
     def orchestrator(self, endpoint, ticker, limit, _from, to, query, exchange, company_name):
         """
@@ -332,31 +188,13 @@ class EndpointBuilder():
         Returns:
             str: Constructed API endpoint URL for the specified endpoint.
        """
-        builder = {
-            "income-statement" : self.income_statement(ticker),
-            "balance-sheet-statement" : self.balance_sheet_statement(ticker),
-            "cash-flow-statement" : self.cash_flow_statement(ticker),
-            "cash-flow-statement-growth" : self.cash_flow_statement_growth(ticker),
-            "balance-sheet-statement-growth" : self.balance_sheet_statement_growth(ticker),
-            "income-statement-growth" : self.income_statement_growth(ticker),
-            "profile" : self.profile(ticker),
-            "delisted-companies" : self.delisted_companies(),
-            "stock-price-change" : self.stock_price_change(ticker),
-            "discounted-cash-flow" : self.discounted_cash_flow(ticker),
-            "rating" : self.rating(ticker),
-            "historical-market-capitalization" : self.historical_market_capitalization(
-                ticker, 
-                limit, 
-                _from, 
-                to
-            ),
-            "search-ticker" : self.search_ticker(query, exchange),
-            "cik-search" : self.cik_search(company_name),
-            "financial-statement-symbol-lists" : self.financial_statement_symbol_lists(),
-            "key-metrics" : self.key_metrics(ticker),
-            "fmp" : self.fmp(),
-            "financial-statement-full-as-reported" : self.financial_statement_full_as_reported(ticker),
-            "financial-growth" : self.financial_growth(ticker)
-        }
-
-        return builder[endpoint]
\ No newline at end of file
+        return self.build(
+            endpoint,
+            ticker = ticker,
+            limit = limit,
+            _from = _from,
+            to = to,
+            query = query,
+            exchange = exchange,
+            company_name = company_name
+        )
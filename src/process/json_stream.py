@@ -0,0 +1,61 @@
+import json
+
+try:
+    import ijson
+except ImportError:  # Falls back to a full parse followed by the projection
+    ijson = None
+
+
+def _project(record, discard):
+    return {key: value for key, value in record.items() if key not in discard}
+
+
+def parse_projected(stream, discard = ()):
+    """
+    Parses a JSON document from a file-like object, dropping record keys while parsing.
+
+    The projection applies to the keys of the top-level object, or of every object in a
+    top-level array (the shape of every Financial Modeling Prep response). With ijson the
+    body is read incrementally and the values of dropped keys are never built, otherwise the
+    whole document is loaded and projected afterwards.
+
+    Args:
+        stream: Binary file-like object with the JSON document (e.g. `response.raw`).
+        discard (iterable): Keys to drop from every record.
+
+    Returns:
+        The parsed document with the projection applied.
+    """
+    discard = frozenset(discard)
+
+    if ijson is None:
+        document = json.load(stream)
+        if not discard:
+            return document
+        if isinstance(document, list):
+            return [_project(item, discard) if isinstance(item, dict) else item for item in document]
+        if isinstance(document, dict):
+            return _project(document, discard)
+        return document
+
+    # Depth is tracked from the events, ijson prefixes join keys with dots and cannot tell
+    # a key "a.b" from the key "b" nested in "a"
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    record_depth = None
+    skipping = False
+    for event, value in ijson.basic_parse(stream, use_float=True):
+        if record_depth is None:
+            record_depth = 2 if event == "start_array" else 1
+        if event in ("end_map", "end_array"):
+            depth -= 1
+            if depth < record_depth:
+                skipping = False
+        elif event == "map_key" and depth == record_depth:
+            skipping = value in discard
+        if not skipping:
+            builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+
+    return builder.value
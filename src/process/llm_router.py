@@ -1,14 +1,40 @@
 import json
 import os
+import time
 from dotenv import load_dotenv
 
 import process.prompts as prompts
+from process.cache import DiskCache
 from process.logger import Logger
+from process.rate_limit import estimate_tokens, llm_limiter
+from process.routing_cache import RoutingCache
+from process.rule_router import RuleRouter
+from process.symbol_index import symbol_index
+from process.single_flight import SingleFlight
+from process.usage import usage_ledger
 
 load_dotenv()
 
 logger = Logger()
 
+# Shared by every router in the process so concurrent sessions coalesce identical preprocess calls
+single_flight = SingleFlight(
+    lock_dir = os.getenv("SINGLE_FLIGHT_DIR", os.path.join(os.getcwd(), "data", "cache", "locks")),
+    store = DiskCache(os.path.join(os.getcwd(), "data", "cache", "single_flight"), max_bytes = 16 * 1024 * 1024)
+)
+
+# Shared by every router in the process, repeated questions skip the routing call
+routing_cache = RoutingCache(
+    max_entries = int(os.getenv("ROUTING_CACHE_SIZE", 1024)),
+    threshold = float(os.getenv("ROUTING_CACHE_THRESHOLD", 0.8))
+)
+
+# Answers the unambiguous requests before any cache or LLM lookup
+rule_router = RuleRouter(
+    min_confidence = float(os.getenv("RULE_ROUTER_MIN_CONFIDENCE", 0.9)),
+    symbol_index = symbol_index
+)
+
 class LLMRouter:
     def __init__(self, azure_client):
         self.client = azure_client
@@ -24,7 +50,25 @@ class LLMRouter:
             module_name = "LLMRouter.defininf_agents"
         )
 
-        response = self.client.chat.completions.create(
+        if os.getenv("RULE_ROUTER_ENABLED", "true").lower() == "true":
+            routing_result, confidence = rule_router.route(user_input)
+            if routing_result is not None:
+                logger.log_info(
+                    message = f"Routing resolved by rules (confidence {confidence:.2f}, hit rate {rule_router.hit_rate:.1%})",
+                    module_name = "LLMRouter.defining_agents"
+                )
+                return routing_result
+
+        use_cache = os.getenv("ROUTING_CACHE_ENABLED", "true").lower() == "true"
+        cached = routing_cache.lookup(user_input) if use_cache else None
+        if cached is not None:
+            logger.log_info(
+                message = f"Routing served from cache ({routing_cache.stats})",
+                module_name = "LLMRouter.defining_agents"
+            )
+            return cached
+
+        response = self._create(
             model=os.getenv("MODEL"),
             messages=[
                 {"role": "system", "content": self.prompts_available[process]},
@@ -32,7 +76,12 @@ class LLMRouter:
             ],
             response_format={"type": "json_object"}
         )
-        return json.loads(response.choices[0].message.content)
+        routing_result = json.loads(response.choices[0].message.content)
+
+        # Invalid inputs are not cached, a fuzzy match must never turn them valid
+        if use_cache and "Error" not in routing_result:
+            routing_cache.add(user_input, routing_result)
+        return routing_result
 
     def preprocess_data(self, data, process):
         logger.log_info(
@@ -40,7 +89,11 @@ class LLMRouter:
             module_name = "LLMRouter.preprocess_data"
         )
 
-        response = self.client.chat.completions.create(
+        key = DiskCache.make_key(process, os.getenv("MODEL"), data)
+        return single_flight.do(key, lambda: self._preprocess_data(data, process))
+
+    def _preprocess_data(self, data, process):
+        response = self._create(
             model = os.getenv("MODEL"),
             messages = [
                 {
@@ -59,7 +112,7 @@ class LLMRouter:
         return json.loads(response.choices[0].message.content)
     
     def postprocess_data(self, data, process):
-        response = self.client.chat.completions.create(
+        response = self._create(
             model = os.getenv("MODEL"),
             messages = [
                 {
@@ -76,3 +129,73 @@ class LLMRouter:
             }
         )
         return json.loads(response.choices[0].message.content)
+
+    def stream_completion(self, messages, model = None, max_tokens = None, temperature = None):
+        """
+        Streams a chat completion through the shared LLM rate limiter.
+
+        Args:
+            messages (list): Chat messages.
+            model (str, optional): Deployment name, defaults to 'MODEL'.
+            max_tokens (int, optional): Completion token limit, no limit when None.
+            temperature (float, optional): Sampling temperature, the service default when None.
+
+        Yields:
+            str: Content deltas as they arrive. Clients without streaming (the replay
+                client) yield the whole answer at once.
+        """
+        options = {"model": model or os.getenv("MODEL"), "messages": messages}
+        if max_tokens is not None:
+            options["max_tokens"] = max_tokens
+        if temperature is not None:
+            options["temperature"] = temperature
+
+        completions = self.client.chat.completions
+        if not hasattr(completions, "with_raw_response"):
+            response = self._create(**options)
+            yield response.choices[0].message.content
+            return
+
+        estimated = estimate_tokens(messages, max_tokens or 1000)
+        start = time.perf_counter()
+        stream = llm_limiter.call(
+            lambda: completions.create(
+                **options,
+                stream = True,
+                stream_options = {"include_usage": True}
+            ),
+            estimated
+        )
+        used = None
+        for chunk in stream:
+            # The last chunk only carries the usage of the whole completion
+            if chunk.usage is not None:
+                self._record_usage(chunk, time.perf_counter() - start, options["model"])
+                used = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        llm_limiter.update(estimated = estimated, used = used)
+
+    def _create(self, **kwargs):
+        """
+        Sends a chat completion through the shared LLM rate limiter.
+        """
+        estimated = estimate_tokens(kwargs["messages"], 500)
+        completions = self.client.chat.completions
+
+        def send():
+            # The raw response exposes the rate limit headers, the replay client has none
+            if hasattr(completions, "with_raw_response"):
+                raw = completions.with_raw_response.create(**kwargs)
+                return raw.parse(), raw.headers
+            return completions.create(**kwargs), {}
+
+        start = time.perf_counter()
+        response, headers = llm_limiter.call(send, estimated)
+        used = response.usage.total_tokens if response.usage is not None else None
+        llm_limiter.update(headers, estimated, used)
+        self._record_usage(response, time.perf_counter() - start)
+        return response
+
+    def _record_usage(self, response, seconds = None, model = None):
+        usage_ledger.record_completion(response.usage, seconds = seconds, model = model or os.getenv("MODEL"))
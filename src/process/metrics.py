@@ -0,0 +1,158 @@
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_current_metrics = ContextVar("request_metrics", default=None)
+
+
+def current_metrics():
+    """
+    Returns the RequestMetrics of the request being processed in this context, if any.
+    """
+    return _current_metrics.get()
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB, None where unavailable.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RequestMetrics:
+    """
+    Per-stage latency and token counts of a single `process_request` call.
+
+    Stages may run concurrently in several threads, each thread keeps its own stack of
+    running stages so tokens are attributed to the stage of the thread that spent them.
+
+    Attributes:
+        stages (dict): Stage name to {'seconds': float, 'tokens': int}, in execution order.
+        throttle_seconds (float): Time the LLM calls of the request waited for the rate limiter.
+        queue_seconds (float): Time the FMP calls of the request waited for the API quota.
+        first_token_seconds (float): Time until the first token of the report was streamed, if streamed.
+        listener (callable, optional): Receives a progress event dict when a stage starts or finishes.
+        request_id (str): Identifies the request in the usage log.
+        usage (dict): Prompt, completion and cached tokens and cost of every LLM call of the request.
+        status (str): 'ok', 'invalid_input' (the router rejected the request) or 'error', None while running.
+        error (str): Why the request did not produce a report, if it did not.
+    """
+    def __init__(self, listener = None, request_id = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0}
+        self.stages = {}
+        self.listener = listener
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.total_seconds = None
+        self.throttle_seconds = 0.0
+        self.queue_seconds = 0.0
+        self.first_token_seconds = None
+        self.status = None
+        self.error = None
+
+    @property
+    def _active(self):
+        if not hasattr(self._local, "active"):
+            self._local.active = []
+        return self._local.active
+
+    def record(self, name, seconds = 0.0, tokens = 0):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "tokens": 0})
+            stage["seconds"] += seconds
+            stage["tokens"] += tokens
+
+    def event(self, name, status, seconds = None):
+        """
+        Sends a progress event ('started' or 'finished') of stage `name` to the listener.
+        """
+        if self.listener is not None:
+            self.listener({"type": "stage", "stage": name, "status": status, "seconds": seconds})
+
+    def mark_first_token(self):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self._started
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as stage `name`.
+        """
+        self.record(name)
+        self._active.append(name)
+        self.event(name, "started")
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds = seconds)
+            self._active.pop()
+            self.event(name, "finished", seconds)
+
+    def current_stage(self):
+        """
+        Returns the innermost stage running in this thread.
+        """
+        return self._active[-1] if self._active else "unattributed"
+
+    def add_tokens(self, tokens, stage = None):
+        """
+        Adds tokens to `stage`, by default the innermost stage currently running.
+        """
+        self.record(stage or self.current_stage(), tokens = tokens)
+
+    def add_usage(self, entry):
+        """
+        Adds a UsageLedger entry to the request totals and the tokens of its stage.
+        """
+        self.record(entry["stage"], tokens = entry["prompt_tokens"] + entry["completion_tokens"])
+        with self._lock:
+            self.usage["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost"):
+                self.usage[key] += entry[key]
+
+    def add_throttle(self, seconds):
+        with self._lock:
+            self.throttle_seconds += seconds
+
+    def add_queue_wait(self, seconds):
+        with self._lock:
+            self.queue_seconds += seconds
+
+    @contextmanager
+    def activate(self):
+        """
+        Makes these metrics the `current_metrics()` of the enclosed block.
+        """
+        token = _current_metrics.set(self)
+        try:
+            yield self
+        finally:
+            self.total_seconds = time.perf_counter() - self._started
+            _current_metrics.reset(token)
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "error": self.error,
+            "total_seconds": self.total_seconds,
+            "stages": self.stages,
+            "throttle_seconds": self.throttle_seconds,
+            "queue_seconds": self.queue_seconds,
+            "first_token_seconds": self.first_token_seconds,
+            "usage": self.usage,
+            "peak_rss_mb": peak_rss_mb()
+        }
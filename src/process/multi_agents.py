@@ -1,35 +1,141 @@
+import os
+import queue
+import threading
+from functools import partial
+from dotenv import load_dotenv
 from openai import AzureOpenAI
+from crewai.tasks.task_output import TaskOutput
 
 from process.agents import AgentFactory
+from process.agent_memo import agent_memo
 from process.api_call import FinancialModelingPrepAPI
+from process.endpoint import get_agent_endpoints
 from process.llm_router import LLMRouter
 from process.api_response_preprocessing import PreprocessResponse
+from process.record_replay import RecordReplayClient, get_mode
 from .utils import print_metrics
 from process.logger import Logger
+from process.metrics import RequestMetrics, current_metrics
+from process.report_cache import report_cache
+from process.symbol_index import symbol_index
+from process.task_graph import TaskGraph
+
+load_dotenv()
 
 logger = Logger()
 
 class MultiAgentSystem:
     def __init__(self, azure_endpoint, azure_key, api_version):
-        self.azure_client = AzureOpenAI(
-            api_key=azure_key,  
-            api_version=api_version,
-            azure_endpoint=azure_endpoint
-        )
+        mode = get_mode()
+        if mode == "replay":
+            # Recorded completions are served without credentials nor network
+            self.azure_client = RecordReplayClient(None)
+        else:
+            self.azure_client = AzureOpenAI(
+                api_key=azure_key,  
+                api_version=api_version,
+                azure_endpoint=azure_endpoint
+            )
+            if mode == "record":
+                self.azure_client = RecordReplayClient(self.azure_client)
         self.llm_router = LLMRouter(self.azure_client)
         self.api_client = FinancialModelingPrepAPI()
         self.preprocess = PreprocessResponse()
+        # Reused by every request, the agent templates and the CrewAI LLM are built once
+        self.agent_factory = AgentFactory()
+        self.max_workers = int(os.getenv("PIPELINE_MAX_WORKERS", 8))
+        self.parallel_agents = os.getenv("AGENT_EXECUTION", "parallel").lower() == "parallel"
+        self.agent_slots = threading.BoundedSemaphore(int(os.getenv("AGENT_MAX_WORKERS", 3)))
+        self.report_cache_enabled = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+        self.agent_memo_enabled = os.getenv("AGENT_MEMO_ENABLED", "true").lower() == "true"
+        self.symbol_index_enabled = os.getenv("SYMBOL_INDEX_ENABLED", "true").lower() == "true"
+        if self.symbol_index_enabled:
+            symbol_index.ensure_fresh(self.api_client)
 
         logger.log_info(
-            message = "Instantiated AzureOpenAI, LLMRouter, FinancialModelingPrepAPI and PreprocessResponse",
+            message = "Instantiated AzureOpenAI, LLMRouter, FinancialModelingPrepAPI, PreprocessResponse and AgentFactory",
             module_name = "MultiAgentSystem.__init__"
         )
 
-    def process_request(self, user_input):
+    def process_request(self, user_input, metrics = None):
+        # Per-stage latency and tokens, available afterwards in self.last_metrics.
+        # Concurrent callers pass their own RequestMetrics, last_metrics is shared by them
+        metrics = metrics or RequestMetrics()
+        self.last_metrics = metrics
+        try:
+            with metrics.activate():
+                result = self._process_request(user_input, metrics)
+        except Exception as error:
+            metrics.status, metrics.error = "error", f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            self.log_usage(metrics)
+        self.set_status(metrics, result)
+        return result
+
+    def process_request_stream(self, user_input):
+        """
+        Processes a request in a background thread, streaming its progress.
+
+        Yields:
+            dict: Progress events as they happen: {'type': 'stage', 'stage', 'status', 'seconds'}
+                when a stage starts or finishes, {'type': 'token', 'text'} for each chunk of the
+                streamed report and a last {'type': 'result', 'text'} with the whole answer.
+        """
+        events = queue.Queue()
+        metrics = RequestMetrics(listener = events.put)
+        self.last_metrics = metrics
+
+        def run():
+            try:
+                with metrics.activate():
+                    result = self._process_request(user_input, metrics, emit = events.put)
+                self.log_usage(metrics)
+                self.set_status(metrics, result)
+                events.put({"type": "result", "text": str(result)})
+            except Exception as error:
+                metrics.status, metrics.error = "error", f"{type(error).__name__}: {error}"
+                events.put({"type": "error", "error": error})
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            if event["type"] == "error":
+                raise event["error"]
+            yield event
+
+    def set_status(self, metrics, result):
+        """
+        Marks the request as answered, unless the router already marked it as invalid.
+        """
+        if metrics.status is not None:
+            return
+        if result is None:
+            metrics.status, metrics.error = "error", "No report was produced"
+        else:
+            metrics.status = "ok"
+
+    def log_usage(self, metrics):
+        usage = metrics.usage
+        logger.log_info(
+            message = f"Request {metrics.request_id}: {usage['calls']} LLM calls, {usage['prompt_tokens']} prompt tokens "
+                      f"({usage['cached_tokens']} cached), {usage['completion_tokens']} completion tokens, USD {usage['cost']:.4f}",
+            module_name = "MultiAgentSystem.log_usage"
+        )
+
+    def _process_request(self, user_input, metrics, emit = None):
         # Route agents
-        routing_result = self.llm_router.defining_agents(user_input, "define_agents")
+        with metrics.stage("routing"):
+            routing_result = self.llm_router.defining_agents(user_input, "define_agents")
+            if self.symbol_index_enabled:
+                routing_result = symbol_index.validate(routing_result)
 
         if "Error" in routing_result:
+            metrics.status, metrics.error = "invalid_input", str(routing_result["Error"])
             logger.log_error(
                 message = "Error - Check the LLM response, there seems to be an error",
                 module_name = "MultiAgentSystem.process_request"
@@ -41,8 +147,6 @@ class MultiAgentSystem:
             module_name = "MultiAgentSystem.process_request"
         )
         selected_agents = routing_result["agentes"]
-        # Fetch API data
-        endpoints = self.get_endpoints_for_agents(selected_agents)
         # Data needed to make an API call
         company_name = routing_result["empresa"]
         ticker = routing_result["ticker"]
@@ -51,59 +155,237 @@ class MultiAgentSystem:
         _from = "2023-12-04"
         to = "2024-12-04"
         query = ""
-        
-        api_responses = self.api_client.get_endpoints_data(endpoints, ticker, limit, _from, to, query, exchange, company_name)
 
-        # Call Preprocessing Module
-        """
-        Send user_input, selected_agents, api_respones, 
-        """
+        agent_factory = self.agent_factory
 
-        to_preprocess = self.preprocess.clean_api_response(
-            agents = selected_agents,
-            api_responses = api_responses
-        )
-        unnecesary_keys = self.preprocess.llm_preprocess(
-            key_cleanup = to_preprocess,
-            llm_router = self.llm_router
-        )
+        # Each agent goes fetch -> preprocess -> setup on its own, as soon as its data arrives
+        graph = TaskGraph(max_workers = self.max_workers)
+        for agent_name in selected_agents:
+            fetch = graph.add(
+                f"fmp_fetch:{agent_name}",
+                partial(self.fetch_agent_data, agent_name, ticker, limit, _from, to, query, exchange, company_name)
+            )
+            graph.add(
+                f"preprocess:{agent_name}",
+                partial(self.preprocess_agent_data, agent_name),
+                [fetch]
+            )
+
+        # The report key needs the cleaned data of every agent, agents wait for the lookup
+        lookup = None
+        if self.report_cache_enabled and selected_agents:
+            lookup = graph.add(
+                "report_lookup",
+                partial(self.lookup_report, ticker, selected_agents),
+                [f"preprocess:{agent_name}" for agent_name in selected_agents]
+            )
+
+        for agent_name in selected_agents:
+            setup = graph.add(
+                f"agent_setup:{agent_name}",
+                partial(self.setup_agent, agent_factory, agent_name, company_name),
+                [f"preprocess:{agent_name}"] + ([lookup] if lookup else [])
+            )
+            if self.parallel_agents:
+                # Specialists do not depend on each other, each one runs in its own crew
+                graph.add(
+                    f"agent:{agent_name}",
+                    partial(self.run_agent, agent_factory, agent_name),
+                    [setup],
+                    timed = False
+                )
+        results = graph.run(metrics)
+
+        report_key, cached_report = results.get("report_lookup", (None, None))
+        if cached_report is not None:
+            logger.log_info(
+                message = f"Report served from cache ({report_cache.stats})",
+                module_name = "MultiAgentSystem.process_request"
+            )
+            if emit is not None:
+                emit({"type": "token", "text": cached_report})
+            return cached_report
 
-        data_final = self.preprocess.json_key_cleanup(
-            keys_to_discard = unnecesary_keys,
-            api_responses = api_responses
-        )
-    
-        agent_factory = AgentFactory()
         agents = []
         tasks = []
-        times = []
-        token = []
+        specialists = []
 
         if selected_agents:
-            for agent_name in selected_agents:
-                AgentClass = agent_factory.get_agent_class(agent_name)
-                if AgentClass:
-                    agent_ins, task_ins = AgentClass(routing_result["empresa"], data_final)
-                    agents.append(agent_ins)
-                    tasks.append(task_ins)
+            with metrics.stage("crew_setup"):
+                for agent_name in selected_agents:
+                    built = results[f"agent_setup:{agent_name}"]
+                    if built:
+                        agents.append(built[0])
+                        tasks.append(built[1])
+                        specialists.append((agent_name, built))
+                
+                qa_agent, qa_task = agent_factory.create_qa_agent(selected_agents, tasks)
+                agents.append(qa_agent)
+                tasks.append(qa_task)
+                
+                summary_agent, summary_task = agent_factory.SummarizeAgent(tasks, routing_result["empresa"])
+                agents.append(summary_agent)
+                tasks.append(summary_task)
+
+                executions = [agent for agent in selected_agents if agent_factory.get_agent_class(agent)] + ["QA Agent", "Summarize Agent"]
+                stage_names = [f"agent:{agent}" for agent in executions[:-2]] + ["qa", "summary"]
+                if self.parallel_agents:
+                    # The specialist outputs are already in their tasks, used as context by QA and summary
+                    agents, tasks = agents[-2:], tasks[-2:]
+                    executions, stage_names = executions[-2:], stage_names[-2:]
                 else:
-                    print(f"Warning: No agent class found for {agent_name}")
-            
-            qa_agent, qa_task = agent_factory.create_qa_agent(selected_agents, tasks)
-            agents.append(qa_agent)
-            tasks.append(qa_task)
-            
-            summary_agent, summary_task = agent_factory.SummarizeAgent(tasks, routing_result["empresa"])
-            agents.append(summary_agent)
-            tasks.append(summary_task)
-            summary_crew, times, token, outputs = agent_factory.create_crew(agents, tasks)
+                    # Memoized specialists keep their output in the task and only serve as context
+                    rerun = [index for index, (_, built) in enumerate(specialists) if not built[3]] + [-2, -1]
+                    agents, tasks = [agents[index] for index in rerun], [tasks[index] for index in rerun]
+                    executions, stage_names = [executions[index] for index in rerun], [stage_names[index] for index in rerun]
+                if emit is not None:
+                    # The summary is streamed outside of the crew
+                    agents, tasks = agents[:-1], tasks[:-1]
+                    executions, stage_names = executions[:-1], stage_names[:-1]
+                summary_crew, times, token, outputs = agent_factory.create_crew(agents, tasks, stage_names)
+
             final_result = summary_crew.kickoff()
 
-            executions = list(selected_agents) + ["QA Agent", "Summarize Agent"]
             print_metrics(times, token, outputs, executions, summary_crew)
+
+            if not self.parallel_agents:
+                for agent_name, built in specialists:
+                    self.memoize_output(agent_name, built)
+
+            if emit is not None:
+                final_result = self.stream_summary(agent_factory, summary_agent, summary_task, metrics, emit)
+
+            if report_key is not None:
+                report_cache.set(report_key, str(final_result))
             
             return final_result
 
+    def stream_summary(self, agent_factory, summary_agent, summary_task, metrics, emit):
+        """
+        Streams the summary report from Azure OpenAI, each chunk is sent to `emit`.
+        The model, token limit and temperature are the ones of the summary agent LLM.
+        """
+        report = []
+        llm = summary_agent.llm
+        with metrics.stage("summary"):
+            messages = agent_factory.task_messages(summary_agent, summary_task)
+            stream = self.llm_router.stream_completion(
+                messages,
+                # CrewAI models are '<provider>/<deployment>'
+                model = llm.model.split("/", 1)[-1],
+                max_tokens = llm.max_tokens,
+                temperature = llm.temperature
+            )
+            for delta in stream:
+                metrics.mark_first_token()
+                report.append(delta)
+                emit({"type": "token", "text": delta})
+        return "".join(report)
+
+    def fetch_agent_data(self, agent_name, ticker, limit, _from, to, query, exchange, company_name):
+        """
+        Fetches the endpoints of one agent as columnar tables.
+        """
+        endpoints = self.get_endpoints_for_agents([agent_name])
+        api_responses = self.api_client.get_endpoints_data(endpoints, ticker, limit, _from, to, query, exchange, company_name)
+        return self.preprocess.to_columnar(api_responses)
+
+    def preprocess_agent_data(self, agent_name, api_responses):
+        """
+        Drops the keys the LLM considers unnecessary for one agent. Each step is timed as
+        its own stage (key_extraction, llm_preprocess and key_cleanup, suffixed with the agent).
+        """
+        metrics = current_metrics() or RequestMetrics()
+        with metrics.stage(f"key_extraction:{agent_name}"):
+            to_preprocess = self.preprocess.clean_api_response(
+                agents = [agent_name],
+                api_responses = api_responses
+            )
+        with metrics.stage(f"llm_preprocess:{agent_name}"):
+            unnecesary_keys = self.preprocess.llm_preprocess(
+                key_cleanup = to_preprocess,
+                llm_router = self.llm_router
+            )
+        with metrics.stage(f"key_cleanup:{agent_name}"):
+            return self.preprocess.json_key_cleanup(
+                keys_to_discard = unnecesary_keys,
+                api_responses = api_responses
+            )
+
+    def lookup_report(self, ticker, selected_agents, *agent_data):
+        """
+        Returns the report key of the request and the cached report, None on a miss.
+        """
+        key = report_cache.key(
+            ticker,
+            selected_agents,
+            self.agent_factory.conf.model,
+            self.agent_factory.prompt_version,
+            dict(zip(selected_agents, agent_data))
+        )
+        return key, report_cache.get(key)
+
+    def setup_agent(self, agent_factory, agent_name, company_name, data, lookup = None):
+        """
+        Returns the (agent, task, memo_key, reused) of one specialist, None if there is no such
+        agent or the report is served from cache. When the output of the agent is memoized for
+        the same inputs and prompt, it is set as the task output and `reused` is True.
+        """
+        if lookup is not None and lookup[1] is not None:
+            return None
+        AgentClass = agent_factory.get_agent_class(agent_name)
+        if AgentClass is None:
+            print(f"Warning: No agent class found for {agent_name}")
+            return None
+        agent, task = AgentClass(company_name, data)
+        if not self.agent_memo_enabled:
+            return agent, task, None, False
+
+        memo_key = agent_memo.key(agent_name, agent_factory.conf.model, data, agent, task)
+        output = agent_memo.get(memo_key)
+        if output is None:
+            return agent, task, memo_key, False
+        task.output = TaskOutput(
+            description = task.description,
+            expected_output = task.expected_output,
+            raw = output,
+            agent = agent.role
+        )
+        logger.log_info(
+            message = f"Reusing the memoized output of {agent_name} ({agent_memo.stats})",
+            module_name = "MultiAgentSystem.setup_agent"
+        )
+        return agent, task, memo_key, True
+
+    def memoize_output(self, agent_name, built):
+        """
+        Stores the output of a specialist that was run, keyed by its inputs and prompt.
+        """
+        agent, task, memo_key, reused = built
+        if memo_key is None or reused or task.output is None:
+            return
+        agent_memo.set(memo_key, task.output.raw)
+
+    def run_agent(self, agent_factory, agent_name, built):
+        """
+        Runs one specialist task in its own crew, at most AGENT_MAX_WORKERS at the same time.
+        """
+        if built is None:
+            return None
+        agent, task, _, reused = built
+        metrics = current_metrics()
+        if reused:
+            if metrics is not None:
+                metrics.event(f"agent:{agent_name}", "started")
+                metrics.event(f"agent:{agent_name}", "finished", 0.0)
+            return task.output
+        with self.agent_slots:
+            crew, times, token, outputs = agent_factory.create_crew([agent], [task], [f"agent:{agent_name}"])
+            result = crew.kickoff()
+        print_metrics(times, token, outputs, [agent_name], crew)
+        self.memoize_output(agent_name, built)
+        return result
+
     def get_endpoints_for_agents(self, agents):
         # Map agents to relevant endpoints
         logger.log_info(
@@ -111,16 +393,4 @@ class MultiAgentSystem:
             module_name = "MultiAgentSystem.get_endpoints_for_agents"
         )
 
-        endpoint_mapping = {
-            "Financial": ["income-statement", "cash-flow-statement", "balance-sheet-statement"],
-            "Accounting": ["cash-flow-statement-growth", "balance-sheet-statement-growth", "income-statement-growth"],
-            "Legal" : ["profile"],
-            "Risk": ["rating", "financial-growth"],
-            "Investment" : ["stock-price-change", "historical-market-capitalization", "discounted-cash-flow"]
-        }
-        
-        endpoints = []
-        for agent in agents:
-            endpoints.extend(endpoint_mapping.get(agent, []))
-        
-        return list(set(endpoints))
+        return get_agent_endpoints(agents)
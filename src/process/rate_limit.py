@@ -0,0 +1,350 @@
+import os
+import time
+import random
+import threading
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+from process.logger import Logger
+from process.metrics import current_metrics
+from process.usage import add_task_usage
+
+load_dotenv()
+
+logger = Logger()
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Responses of the litellm completions made by the LLM call running in this context
+_llm_responses = ContextVar("llm_responses", default=None)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with first-come first-served waiting.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Callers are served
+    strictly in arrival order, so a burst from one session cannot starve the others.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens stored, i.e. the allowed burst.
+    """
+    def __init__(self, rate, capacity = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens = 1):
+        """
+        Blocks until `tokens` are available and takes them.
+
+        Args:
+            tokens (float): Number of tokens to take, capped to the bucket capacity.
+
+        Returns:
+            float: Seconds spent waiting in the queue.
+        """
+        tokens = min(tokens, self.capacity)
+        start = time.monotonic()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while True:
+                timeout = None
+                if ticket == self._serving:
+                    self._refill()
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        self._serving += 1
+                        self._condition.notify_all()
+                        return time.monotonic() - start
+                    timeout = (tokens - self._tokens) / self.rate
+                self._condition.wait(timeout)
+
+    def adjust(self, tokens = 0.0, remaining = None, capacity = None, rate = None):
+        """
+        Corrects the bucket with information known after the fact.
+
+        Args:
+            tokens (float): Tokens given back (positive) or taken (negative), the level can go
+                below zero so the next callers wait for the debt.
+            remaining (float, optional): Upper bound of the level, e.g. reported by the server.
+            capacity (float, optional): New capacity.
+            rate (float, optional): New refill rate per second.
+        """
+        with self._condition:
+            self._refill()
+            if capacity:
+                self.capacity = float(capacity)
+            if rate:
+                self.rate = float(rate)
+            self._tokens = min(self.capacity, self._tokens + tokens)
+            if remaining is not None:
+                self._tokens = min(self._tokens, float(remaining))
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    Sends HTTP requests within a calls-per-minute quota and retries throttled or failed calls.
+
+    Every attempt takes a token from a shared TokenBucket. Responses with a status in
+    RETRY_STATUS are retried with jittered exponential backoff, honoring 'Retry-After'.
+
+    Attributes:
+        bucket (TokenBucket): Quota shared by every request sent through the scheduler.
+        max_retries (int): Retries after the first attempt.
+        backoff_base (float): Backoff of the first retry in seconds.
+        backoff_cap (float): Maximum backoff in seconds.
+    """
+    def __init__(self, calls_per_minute, max_retries = 4, backoff_base = 1.0, backoff_cap = 30.0):
+        self.bucket = TokenBucket(rate = calls_per_minute / 60.0, capacity = max(1, calls_per_minute // 6))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "queue_wait": 0.0, "max_queue_wait": 0.0}
+
+    def backoff(self, attempt, response = None):
+        """
+        Returns the seconds to wait before retry number `attempt` (starting at 0).
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_cap, float(retry_after))
+            except ValueError:
+                pass
+        ceiling = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def execute(self, send):
+        """
+        Sends a request through the quota, retrying throttled and server errors.
+
+        Args:
+            send (callable): Zero-argument callable returning a `requests.Response`.
+
+        Returns:
+            tuple: The last response and the total seconds spent waiting in the queue.
+        """
+        waited = 0.0
+        attempt = 0
+        while True:
+            wait = self.bucket.acquire()
+            waited += wait
+            response = send()
+
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["queue_wait"] += wait
+                self.stats["max_queue_wait"] = max(self.stats["max_queue_wait"], wait)
+
+            if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                return response, waited
+
+            delay = self.backoff(attempt, response)
+            # Only the last response is returned, the others go back to the pool
+            response.close()
+            logger.log_warning(
+                message = f"Status {response.status_code}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s",
+                module_name = "RequestScheduler.execute"
+            )
+            with self._lock:
+                self.stats["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
+
+
+def estimate_tokens(messages, completion_tokens = 0):
+    """
+    Rough token count of chat messages (4 characters per token) plus the expected completion.
+    """
+    if isinstance(messages, str):
+        text = messages
+    else:
+        text = "".join(str(message.get("content", "")) if isinstance(message, dict) else str(message) for message in messages)
+    return len(text) // 4 + completion_tokens
+
+
+class LLMRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by every LLM call of the process.
+
+    Calls wait only when a budget is exhausted. The token bucket is charged with an estimate
+    before the call and corrected with the real usage afterwards, both budgets follow the
+    'x-ratelimit-*' response headers when available. A 429 empties the budgets for its
+    'Retry-After' so every caller backs off, not only the one that was throttled.
+
+    Attributes:
+        requests (TokenBucket): Requests per minute budget.
+        tokens (TokenBucket): Tokens per minute budget.
+        max_retries (int): Retries of a call answered with 429.
+        stats (dict): Calls, 429 responses and total seconds spent throttled.
+    """
+    def __init__(self, tokens_per_minute, requests_per_minute, max_retries = 4, backoff_cap = 60.0):
+        self.tokens = TokenBucket(rate = tokens_per_minute / 60.0, capacity = tokens_per_minute)
+        self.requests = TokenBucket(rate = requests_per_minute / 60.0, capacity = requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+
+    def acquire(self, tokens):
+        """
+        Waits for one request and `tokens` tokens of budget.
+
+        Returns:
+            float: Seconds spent waiting, also added to the current request metrics.
+        """
+        waited = self.requests.acquire() + self.tokens.acquire(tokens)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["throttled_seconds"] += waited
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.add_throttle(waited)
+        if waited > 0.5:
+            logger.log_info(
+                message = f"LLM call throttled {waited:.2f}s",
+                module_name = "LLMRateLimiter.acquire"
+            )
+        return waited
+
+    def update(self, headers = None, estimated = 0, used = None):
+        """
+        Corrects the budgets after a call.
+
+        Args:
+            headers (dict, optional): Response headers with the 'x-ratelimit-*' values.
+            estimated (int): Tokens charged before the call.
+            used (int, optional): Tokens actually used by the call.
+        """
+        if used is not None:
+            self.tokens.adjust(tokens = estimated - used)
+        headers = headers or {}
+        for name, bucket in (("tokens", self.tokens), ("requests", self.requests)):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                bucket.adjust(
+                    remaining = float(remaining) if remaining is not None else None,
+                    capacity = float(limit) if limit else None,
+                    rate = float(limit) / 60.0 if limit else None
+                )
+            except ValueError:
+                continue
+
+    def call(self, send, estimated):
+        """
+        Runs `send` within the budgets, retrying it when the service answers 429.
+
+        Args:
+            send (callable): Zero-argument callable that performs the LLM call.
+            estimated (int): Tokens the call is expected to use.
+
+        Returns:
+            The result of `send`.
+        """
+        attempt = 0
+        while True:
+            self.acquire(estimated)
+            try:
+                return send()
+            except Exception as error:
+                if getattr(error, "status_code", None) != 429 or attempt >= self.max_retries:
+                    raise
+                delay = min(self.backoff_cap, 2 ** attempt)
+                response = getattr(error, "response", None)
+                try:
+                    delay = min(self.backoff_cap, float(response.headers.get("retry-after")))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                logger.log_warning(
+                    message = f"LLM rate limited, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s",
+                    module_name = "LLMRateLimiter.call"
+                )
+                # Every caller, this one included, waits until the delay has passed
+                self.requests.adjust(remaining = 1 - delay * self.requests.rate)
+                self.tokens.adjust(remaining = estimated - delay * self.tokens.rate)
+                attempt += 1
+
+
+def measure_completions():
+    """
+    Wraps `litellm.completion`, the function CrewAI calls, so the LLM call running in the
+    current context sees its own responses. CrewAI only reports usage through the process-wide
+    `litellm.callbacks`, which concurrent crews overwrite.
+    """
+    import litellm
+
+    completion = litellm.completion
+    if getattr(completion, "measured", False):
+        return
+
+    def measured(*args, **kwargs):
+        response = completion(*args, **kwargs)
+        responses = _llm_responses.get()
+        if responses is not None:
+            responses.append(response)
+        return response
+
+    measured.measured = True
+    litellm.completion = measured
+
+
+def throttle_llm(llm, limiter):
+    """
+    Routes the calls of a CrewAI `LLM` through `limiter` by replacing its `call` method.
+    CrewAI does not expose the response headers, the budgets are corrected with the
+    usage of each response (or the estimated completion size) and follow the headers seen
+    by the other callers. The usage is added to the crew collecting it in the calling
+    context, see `usage.collect_task_usage`.
+
+    Returns:
+        crewai.LLM: The same instance, patched.
+    """
+    limited_call = llm.call
+    measure_completions()
+
+    def call(messages, *args, **kwargs):
+        estimated = estimate_tokens(messages, llm.max_tokens or 0)
+        responses = []
+        token = _llm_responses.set(responses)
+        try:
+            answer = limiter.call(lambda: limited_call(messages, *args, **kwargs), estimated)
+        finally:
+            _llm_responses.reset(token)
+
+        usages = [getattr(response, "usage", None) for response in responses]
+        usages = [usage for usage in usages if usage is not None]
+        for usage in usages:
+            add_task_usage(usage)
+        if usages:
+            used = sum(usage.prompt_tokens + usage.completion_tokens for usage in usages)
+        else:
+            used = estimate_tokens(messages, 0) + estimate_tokens(str(answer))
+        limiter.update(estimated = estimated, used = used)
+        return answer
+
+    llm.call = call
+    return llm
+
+
+# Shared by LLMRouter and the CrewAI agents, the Azure OpenAI quota belongs to the deployment
+llm_limiter = LLMRateLimiter(
+    tokens_per_minute = int(os.getenv("AZURE_OPENAI_TPM", 30000)),
+    requests_per_minute = int(os.getenv("AZURE_OPENAI_RPM", 180)),
+    max_retries = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", 4))
+)
@@ -0,0 +1,190 @@
+import io
+import os
+import re
+import time
+import json
+from dotenv import load_dotenv
+
+from process.cache import DiskCache
+from process.logger import Logger
+
+load_dotenv()
+
+logger = Logger()
+
+MODES = ("live", "record", "replay")
+
+
+def get_mode():
+    """
+    Returns the service mode selected with the 'SERVICE_MODE' environment variable.
+
+    - live: every call goes to Financial Modeling Prep and Azure OpenAI.
+    - record: calls go to the live services and every answer is saved as a fixture.
+    - replay: answers are served from the fixtures, no network access is needed.
+    """
+    mode = os.getenv("SERVICE_MODE", "live").lower()
+    if mode not in MODES:
+        raise ValueError(f"SERVICE_MODE must be one of {', '.join(MODES)}, got '{mode}'")
+    return mode
+
+
+class FixtureStore:
+    """
+    Folder of recorded answers, one JSON file per request fingerprint.
+
+    Attributes:
+        mode (str): 'record' or 'replay'.
+        latency (float): Seconds added to every replayed answer.
+    """
+    def __init__(self, kind, mode = None, directory = None, latency = None):
+        self.mode = mode or get_mode()
+        directory = directory or os.getenv("FIXTURES_DIR", os.path.join(os.getcwd(), "data", "fixtures"))
+        # Fixtures never expire nor get evicted
+        self.store = DiskCache(os.path.join(directory, kind), max_bytes = float("inf"))
+        if latency is None:
+            latency = float(os.getenv(f"REPLAY_{kind.upper()}_LATENCY_MS", 0)) / 1000
+        self.latency = latency
+
+    def load(self, *parts):
+        """
+        Returns the recorded answer for the request `parts`, waiting the injected latency.
+
+        Raises:
+            LookupError: If the request was never recorded.
+        """
+        key = DiskCache.make_key(*parts)
+        answer = self.store.get(key)
+        if answer is None:
+            raise LookupError(f"No fixture recorded for this request ({key}), run once with SERVICE_MODE=record")
+        if self.latency:
+            time.sleep(self.latency)
+        return answer
+
+    def save(self, answer, *parts):
+        self.store.set(DiskCache.make_key(*parts), answer)
+
+
+class ReplayResponse:
+    """
+    Minimal stand-in for `requests.Response` built from a recorded answer.
+    """
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = body.encode("utf-8")
+        self.raw = io.BytesIO(self.content)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"Recorded response has status {self.status_code}")
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordReplaySession:
+    """
+    Wraps a `requests.Session` to record or replay Financial Modeling Prep responses.
+    Fixtures are keyed by URL without the API key.
+    """
+    def __init__(self, session, fixtures = None):
+        self.session = session
+        self.fixtures = fixtures or FixtureStore("fmp")
+
+    def get(self, url, **kwargs):
+        fingerprint = re.sub(r"apikey=[^&]*", "apikey=", url)
+
+        if self.fixtures.mode == "replay":
+            answer = self.fixtures.load(fingerprint)
+            return ReplayResponse(answer["status_code"], answer["headers"], answer["body"])
+
+        response = self.session.get(url, **kwargs)
+        answer = {
+            "status_code": response.status_code,
+            "headers": {key: value for key, value in response.headers.items() if key.lower() == "retry-after"},
+            "body": response.content.decode("utf-8")
+        }
+        if response.ok:
+            self.fixtures.save(answer, fingerprint)
+        return ReplayResponse(answer["status_code"], answer["headers"], answer["body"])
+
+    def mount(self, *args, **kwargs):
+        if self.session is not None:
+            self.session.mount(*args, **kwargs)
+
+
+class _Completions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, **kwargs):
+        return self.owner.create_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, owner):
+        self.completions = _Completions(owner)
+
+
+class RecordReplayClient:
+    """
+    Wraps an `AzureOpenAI` client to record or replay chat completions.
+    Only `client.chat.completions.create` is intercepted, which is what LLMRouter uses.
+    In replay mode `client` can be None.
+    """
+    def __init__(self, client, fixtures = None):
+        self.client = client
+        self.fixtures = fixtures or FixtureStore("llm")
+        self.chat = _Chat(self)
+
+    def create_completion(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+
+        fingerprint = ("chat", kwargs.get("model"), kwargs.get("messages"), kwargs.get("response_format"))
+
+        if self.fixtures.mode == "replay":
+            return ChatCompletion.model_validate(self.fixtures.load(*fingerprint))
+
+        response = self.client.chat.completions.create(**kwargs)
+        self.fixtures.save(response.model_dump(mode="json"), *fingerprint)
+        return response
+
+
+def wrap_llm(llm, fixtures = None):
+    """
+    Records or replays the calls of a CrewAI `LLM` by replacing its `call` method.
+
+    Args:
+        llm (crewai.LLM): The LLM given to the agents.
+        fixtures (FixtureStore, optional): Defaults to the 'llm' fixtures.
+
+    Returns:
+        crewai.LLM: The same instance, patched.
+    """
+    fixtures = fixtures or FixtureStore("llm")
+    live_call = llm.call
+
+    def call(messages, *args, **kwargs):
+        fingerprint = ("crew", llm.model, messages)
+        if fixtures.mode == "replay":
+            return fixtures.load(*fingerprint)
+        answer = live_call(messages, *args, **kwargs)
+        fixtures.save(answer, *fingerprint)
+        return answer
+
+    llm.call = call
+    return llm
@@ -0,0 +1,97 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+from process.cache import DiskCache
+from process.logger import Logger
+
+load_dotenv()
+
+logger = Logger()
+
+
+class ReportCache:
+    """
+    Content-addressed cache of the final reports.
+
+    A report is identified by the resolved ticker, the sorted agents, the model, the prompt
+    version (which covers how the data is rendered in the prompts) and a fingerprint of the cleaned API data, so any change in the data or in the
+    prompts produces a new key. Entries expire after `ttl` and the store is size bounded (LRU).
+    Invalidating a ticker bumps its generation, which is part of the key, so the previous
+    reports are never served again and age out of the store. Generations are kept in their
+    own store, which is never evicted, so an invalidation can not be undone by the LRU.
+
+    Attributes:
+        store (DiskCache): Where the reports are kept.
+        generations (DiskCache): Where the ticker generations are kept.
+        ttl (float): Seconds a report is served from cache.
+    """
+    def __init__(self, store, generations, ttl = 24 * 60 * 60):
+        self.store = store
+        self.generations = generations
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _generation(self, ticker):
+        return self.generations.get(DiskCache.make_key("report_generation", ticker)) or 0
+
+    def key(self, ticker, agents, model, prompt_version, data):
+        """
+        Args:
+            ticker (str): Resolved ticker.
+            agents (list): Selected agents, order does not matter.
+            model (str): Model used by the agents.
+            prompt_version (str): Hash of the agent prompts and of the data rendering settings.
+            data (dict): Cleaned API data given to the agents.
+
+        Returns:
+            str: The report key.
+        """
+        return DiskCache.make_key(
+            "report",
+            ticker,
+            self._generation(ticker),
+            sorted(agents),
+            model,
+            prompt_version,
+            DiskCache.make_key(data)
+        )
+
+    def get(self, key):
+        report = self.store.get(key)
+        with self._lock:
+            self.stats["hits" if report is not None else "misses"] += 1
+        return report
+
+    def set(self, key, report):
+        self.store.set(key, report, self.ttl)
+
+    def invalidate(self, ticker = None):
+        """
+        Stops serving the cached reports of `ticker`, or of every ticker when None.
+        """
+        if ticker is None:
+            self.store.clear()
+        else:
+            generation_key = DiskCache.make_key("report_generation", ticker)
+            with self._lock:
+                self.generations.set(generation_key, self._generation(ticker) + 1)
+        logger.log_info(
+            message = f"Cached reports invalidated for {ticker or 'every ticker'}",
+            module_name = "ReportCache.invalidate"
+        )
+
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(os.getcwd(), "data", "cache", "reports"))
+
+# Shared by every session
+report_cache = ReportCache(
+    store = DiskCache(
+        REPORT_CACHE_DIR,
+        max_bytes = float(os.getenv("REPORT_CACHE_MAX_MB", 64)) * 1024 * 1024
+    ),
+    # One small entry per invalidated ticker, never evicted
+    generations = DiskCache(os.path.join(REPORT_CACHE_DIR, "generations"), max_bytes = float("inf")),
+    ttl = float(os.getenv("REPORT_CACHE_TTL_HOURS", 24)) * 60 * 60
+)
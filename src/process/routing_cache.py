@@ -0,0 +1,131 @@
+import re
+import copy
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from process.logger import Logger
+
+logger = Logger()
+
+STOP_WORDS = frozenset("""
+    a al algo como con conviene de del dame el en es esta este favor hacer la las lo los me mi
+    necesito para por podrias puedes que quiero se sobre su sus te un una unos y
+    an and about can could do for give i is it me my of on please the to want what would you
+""".split())
+
+
+def normalize(text):
+    """
+    Normalizes a user input for routing lookups: lower case, no accents,
+    no punctuation, no stop words and single spaces.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    tokens = re.findall(r"[a-z0-9]+", text)
+    return " ".join(token for token in tokens if token not in STOP_WORDS)
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(first, second):
+    """
+    Jaccard similarity of the character trigrams of two strings.
+    """
+    first, second = trigrams(first), trigrams(second)
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class RoutingCache:
+    """
+    LRU cache of routing results with normalized and fuzzy lookup.
+
+    Inputs are normalized before lookup so case, accents, punctuation and stop words do not
+    matter. Other wording changes are matched with a character trigram index, a candidate is
+    accepted when its similarity reaches `threshold` and every word that differs between
+    both inputs has a close counterpart (so "Apple" never matches "Amazon").
+
+    Attributes:
+        max_entries (int): Maximum number of cached inputs.
+        threshold (float): Minimum similarity, between 0 and 1, for a fuzzy hit.
+        stats (dict): Exact hits, fuzzy hits and misses.
+    """
+    def __init__(self, max_entries = 1024, threshold = 0.8, word_threshold = 0.5):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.word_threshold = word_threshold
+        self._entries = OrderedDict()
+        self._index = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0}
+
+    def _words_match(self, first, second):
+        first_words, second_words = set(first.split()), set(second.split())
+        for word in first_words ^ second_words:
+            others = second_words if word in first_words else first_words
+            if not any(similarity(word, other) >= self.word_threshold for other in others):
+                return False
+        return True
+
+    def lookup(self, user_input):
+        """
+        Returns a copy of the cached routing result for `user_input`, or None.
+        """
+        key = normalize(user_input)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return copy.deepcopy(self._entries[key])
+
+            candidates = {}
+            for gram in trigrams(key):
+                for candidate in self._index.get(gram, ()):
+                    candidates[candidate] = candidates.get(candidate, 0) + 1
+
+            best, best_score = None, 0.0
+            # Only the candidates sharing the most trigrams are scored
+            for candidate, _ in sorted(candidates.items(), key=lambda item: -item[1])[:10]:
+                score = similarity(key, candidate)
+                if score > best_score and score >= self.threshold and self._words_match(key, candidate):
+                    best, best_score = candidate, score
+
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best)
+            self.stats["fuzzy_hits"] += 1
+            logger.log_debug(
+                message = f"Fuzzy routing hit '{key}' -> '{best}' ({best_score:.2f})",
+                module_name = "RoutingCache.lookup"
+            )
+            return copy.deepcopy(self._entries[best])
+
+    def add(self, user_input, routing_result):
+        """
+        Caches the routing result of `user_input`, evicting the least recently used entry if full.
+        """
+        key = normalize(user_input)
+        if not key:
+            return
+        with self._lock:
+            if key not in self._entries:
+                for gram in trigrams(key):
+                    self._index.setdefault(gram, set()).add(key)
+            self._entries[key] = copy.deepcopy(routing_result)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                for gram in trigrams(evicted):
+                    keys = self._index.get(gram)
+                    if keys is not None:
+                        keys.discard(evicted)
+                        if not keys:
+                            del self._index[gram]
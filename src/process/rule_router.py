@@ -0,0 +1,282 @@
+import re
+import threading
+import unicodedata
+
+from process.logger import Logger
+from process.routing_cache import normalize, STOP_WORDS
+
+logger = Logger()
+
+# Normalized keywords (see routing_cache.normalize) that point to each agent
+INTENT_KEYWORDS = {
+    "Financial": ("financiero", "financiera", "financieros", "finanzas", "financial", "finance", "finances",
+                  "estados financieros", "income statement", "balance sheet", "flujo efectivo", "cash flow"),
+    "Accounting": ("contable", "contables", "contabilidad", "accounting", "registros contables", "bookkeeping"),
+    "Legal": ("legal", "legales", "cumplimiento", "compliance", "regulatorio", "regulatorios", "regulatory", "regulacion"),
+    "Risk": ("riesgo", "riesgos", "risk", "risks", "rating", "calificacion"),
+    "Investment": ("invertir", "inversion", "inversiones", "invest", "investing", "investment", "comprar acciones",
+                   "buy stock", "valuacion", "valuation", "precio accion", "stock price"),
+}
+
+# Requests that cover every agent
+GENERAL_KEYWORDS = ("evaluacion general", "analisis general", "analisis completo", "evaluacion completa",
+                    "general evaluation", "general analysis", "full analysis", "overview", "panorama general")
+
+# Topics outside the scope of the agents, always left to the LLM router
+OUT_OF_SCOPE_KEYWORDS = ("ambiental", "environmental", "esg", "clima", "climate", "politica", "politics",
+                         "deporte", "sports", "receta", "recipe")
+
+# Requests that exclude something ("no financial analysis") are left to the LLM router
+NEGATION_WORDS = frozenset("""
+    no not sin without except excepto salvo menos ni nor excluding excluyendo dont don doesn never nunca
+""".split())
+
+# Requests that compare companies are left to the LLM router, which only accepts one company
+COMPARISON_WORDS = frozenset("""
+    vs versus compare compared comparing comparison comparar compara comparado comparada comparacion
+    comparativa contra against frente
+""".split())
+
+# Join two companies ("Apple y Samsung") unless both sides are keywords ("financial and risk")
+CONJUNCTIONS = frozenset("and y e or o".split())
+
+# Words that may follow a company name without naming another company ("Apple Inc.")
+NAME_SUFFIXES = frozenset("""
+    inc corp corporation co company ltd plc llc group holdings stock stocks shares acciones
+""".split())
+
+# Normalized company names and aliases: (company, ticker, exchange)
+COMPANIES = {
+    "apple": ("Apple Inc.", "AAPL", "NASDAQ"),
+    "microsoft": ("Microsoft Corporation", "MSFT", "NASDAQ"),
+    "amazon": ("Amazon.com, Inc.", "AMZN", "NASDAQ"),
+    "alphabet": ("Alphabet Inc.", "GOOGL", "NASDAQ"),
+    "google": ("Alphabet Inc.", "GOOGL", "NASDAQ"),
+    "meta platforms": ("Meta Platforms, Inc.", "META", "NASDAQ"),
+    "facebook": ("Meta Platforms, Inc.", "META", "NASDAQ"),
+    "nvidia": ("NVIDIA Corporation", "NVDA", "NASDAQ"),
+    "tesla": ("Tesla, Inc.", "TSLA", "NASDAQ"),
+    "netflix": ("Netflix, Inc.", "NFLX", "NASDAQ"),
+    "intel": ("Intel Corporation", "INTC", "NASDAQ"),
+    "amd": ("Advanced Micro Devices, Inc.", "AMD", "NASDAQ"),
+    "cisco": ("Cisco Systems, Inc.", "CSCO", "NASDAQ"),
+    "adobe": ("Adobe Inc.", "ADBE", "NASDAQ"),
+    "pepsico": ("PepsiCo, Inc.", "PEP", "NASDAQ"),
+    "starbucks": ("Starbucks Corporation", "SBUX", "NASDAQ"),
+    "costco": ("Costco Wholesale Corporation", "COST", "NASDAQ"),
+    "paypal": ("PayPal Holdings, Inc.", "PYPL", "NASDAQ"),
+    "berkshire hathaway": ("Berkshire Hathaway Inc.", "BRK-B", "NYSE"),
+    "jpmorgan": ("JPMorgan Chase & Co.", "JPM", "NYSE"),
+    "jp morgan": ("JPMorgan Chase & Co.", "JPM", "NYSE"),
+    "visa": ("Visa Inc.", "V", "NYSE"),
+    "mastercard": ("Mastercard Incorporated", "MA", "NYSE"),
+    "walmart": ("Walmart Inc.", "WMT", "NYSE"),
+    "coca cola": ("The Coca-Cola Company", "KO", "NYSE"),
+    "cocacola": ("The Coca-Cola Company", "KO", "NYSE"),
+    "disney": ("The Walt Disney Company", "DIS", "NYSE"),
+    "nike": ("NIKE, Inc.", "NKE", "NYSE"),
+    "mcdonalds": ("McDonald's Corporation", "MCD", "NYSE"),
+    "ibm": ("International Business Machines Corporation", "IBM", "NYSE"),
+    "oracle": ("Oracle Corporation", "ORCL", "NYSE"),
+    "exxon": ("Exxon Mobil Corporation", "XOM", "NYSE"),
+    "exxonmobil": ("Exxon Mobil Corporation", "XOM", "NYSE"),
+    "johnson johnson": ("Johnson & Johnson", "JNJ", "NYSE"),
+    "pfizer": ("Pfizer Inc.", "PFE", "NYSE"),
+    "boeing": ("The Boeing Company", "BA", "NYSE"),
+    "salesforce": ("Salesforce, Inc.", "CRM", "NYSE"),
+    "goldman sachs": ("The Goldman Sachs Group, Inc.", "GS", "NYSE"),
+    "bank america": ("Bank of America Corporation", "BAC", "NYSE"),
+}
+
+
+def _contains(text, phrase):
+    """
+    Whether the normalized `text` contains `phrase` as whole words.
+    """
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+
+def _words(text):
+    """
+    Lower case words of `text` without accents, stop words included.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def _mentions(text, phrases):
+    """
+    Returns the (start, end, phrase) spans of the whole-word mentions of `phrases` in the
+    normalized `text`, longest phrases first and without overlaps.
+    """
+    spans = []
+    for phrase in sorted(phrases, key=len, reverse=True):
+        for match in re.finditer(rf"\b{re.escape(phrase)}\b", text):
+            if all(match.end() <= start or match.start() >= end for start, end, _ in spans):
+                spans.append((match.start(), match.end(), phrase))
+    return sorted(spans)
+
+
+class RuleRouter:
+    """
+    Deterministic router for the common, unambiguous requests.
+
+    A keyword classifier maps the request to the agents and a company lookup resolves the
+    ticker. The result has the same format as `LLMRouter.defining_agents`
+    (agentes, empresa, ticker, exchange) and is only returned when the confidence reaches
+    `min_confidence`, otherwise the caller falls back to the LLM router. Names match whole
+    words (longest first). Several companies, a comparison, a capitalized word that names no
+    known company, a known name inside a longer one or a negation lower the confidence.
+
+    Attributes:
+        min_confidence (float): Minimum confidence, between 0 and 1, to answer without the LLM.
+        companies (dict): Normalized company name or alias to (company, ticker, exchange).
+        symbol_index (SymbolIndex, optional): Listed companies, used to tell "Apple" from
+            "Apple Hospitality REIT".
+        stats (dict): Requests answered ('hits') and left to the LLM ('misses').
+    """
+    def __init__(self, min_confidence = 0.9, companies = None, symbol_index = None):
+        self.min_confidence = min_confidence
+        self.companies = companies if companies is not None else COMPANIES
+        self.symbol_index = symbol_index
+        self.tickers = {ticker: (company, ticker, exchange) for company, ticker, exchange in self.companies.values()}
+        self.vocabulary = {
+            word
+            for phrase in (*GENERAL_KEYWORDS, *OUT_OF_SCOPE_KEYWORDS, *(keyword for keywords in INTENT_KEYWORDS.values() for keyword in keywords))
+            for word in phrase.split()
+        }
+        self.company_words = {word for alias in self.companies for word in alias.split()}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def classify(self, text):
+        """
+        Returns the agents requested in the normalized `text`, in INTENT_KEYWORDS order.
+        """
+        if any(_contains(text, keyword) for keyword in GENERAL_KEYWORDS):
+            return list(INTENT_KEYWORDS)
+        return [
+            agent for agent, keywords in INTENT_KEYWORDS.items()
+            if any(_contains(text, keyword) for keyword in keywords)
+        ]
+
+    def resolve_company(self, user_input, text):
+        """
+        Returns the distinct companies mentioned, by name or by upper case ticker, and whether
+        a name looks like part of a longer company name ("Apple Hospitality REIT").
+        """
+        found = {}
+        extended = False
+        for _, end, alias in _mentions(text, self.companies):
+            company = self.companies[alias]
+            found[company[1]] = company
+            extended = extended or self._extends_name(text, end, alias)
+        for token in re.findall(r"\b[A-Z]{1,5}(?:-[A-Z])?\b", user_input):
+            if token in self.tickers:
+                found[token] = self.tickers[token]
+        return list(found.values()), extended
+
+    def _known_word(self, word):
+        # Single letters are possessives and initials ("Apple's")
+        return (
+            len(word) == 1 or word in self.vocabulary or word in self.company_words or word in NAME_SUFFIXES
+            or word in STOP_WORDS or word in NEGATION_WORDS or word in CONJUNCTIONS
+        )
+
+    def _extends_name(self, text, end, alias):
+        """
+        Whether the mention of `alias` ending at `end` in the normalized `text` continues with
+        a word that is not a keyword, making it part of a longer name. With a symbol index,
+        only the names of listed companies count ("apple hospitality" but not "apple revenue").
+        """
+        following = text[end:].split()[:1]
+        if not following or self._known_word(following[0]):
+            return False
+        longer = f"{alias} {following[0]}"
+        if self.symbol_index is None or not self.symbol_index.available:
+            return True
+        return any(
+            normalize(entry["name"]).startswith(longer)
+            for _, entry in self.symbol_index.search(longer, limit = 10)
+        )
+
+    def names_other_companies(self, user_input):
+        """
+        Whether `user_input` compares companies or has a capitalized word, other than the first
+        of a sentence, that is neither a keyword nor a known company or ticker ("Samsung").
+        """
+        words = _words(user_input)
+        if COMPARISON_WORDS & set(words):
+            return True
+        for index, word in enumerate(words):
+            if word in CONJUNCTIONS:
+                neighbours = words[max(0, index - 1):index] + words[index + 1:index + 2]
+                if any(not self._known_word(neighbour) or neighbour in self.company_words for neighbour in neighbours):
+                    return True
+
+        for match in re.finditer(r"\b[A-Z][\w'-]*", user_input):
+            if not user_input[:match.start()].strip() or user_input[:match.start()].rstrip()[-1] in ".!?¿¡":
+                continue
+            if match.group(0) in self.tickers:
+                continue
+            if any(not self._known_word(word) for word in _words(match.group(0))):
+                return True
+        return False
+
+    def route(self, user_input):
+        """
+        Routes `user_input` without calling any LLM.
+
+        Returns:
+            tuple: The routing result (or None) and its confidence.
+        """
+        text = normalize(user_input)
+        agents = self.classify(text)
+        companies, extended = self.resolve_company(user_input, text)
+
+        confidence = 1.0
+        if not agents:
+            confidence *= 0.3
+        if not companies:
+            # The LLM explains why the input is invalid
+            confidence *= 0.2
+        elif len(companies) > 1:
+            # The more entities, the less likely the rules picked the right one
+            confidence *= 0.5 ** len(companies)
+        if extended:
+            # A known name inside an unknown company name, only the LLM can tell them apart
+            confidence *= 0.3
+        if self.names_other_companies(user_input):
+            # Probably another company the rules do not know, the LLM applies the one-company rule
+            confidence *= 0.3
+        if NEGATION_WORDS & set(text.split()):
+            # The keywords may be excluded rather than requested
+            confidence *= 0.3
+        if any(_contains(text, keyword) for keyword in OUT_OF_SCOPE_KEYWORDS):
+            confidence *= 0.1
+
+        hit = confidence >= self.min_confidence
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+
+        logger.log_debug(
+            message = f"Rule routing confidence {confidence:.2f}, hit rate {self.hit_rate:.1%}",
+            module_name = "RuleRouter.route"
+        )
+
+        if not hit:
+            return None, confidence
+
+        company, ticker, exchange = companies[0]
+        return {
+            "agentes": agents,
+            "empresa": company,
+            "ticker": ticker,
+            "exchange": exchange
+        }, confidence
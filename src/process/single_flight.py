@@ -0,0 +1,135 @@
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows, coalescing falls back to threads of the same process
+    fcntl = None
+
+from process.logger import Logger
+
+logger = Logger()
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls so only one of them reaches the upstream service.
+
+    Within a process, callers with the same key wait for the first caller (the leader)
+    and receive its result. Across worker processes the leader holds an exclusive lock file
+    for the key, and publishes its result in `store` so processes that were waiting on the lock
+    read it instead of calling upstream again. Only a process that found the lock taken reads
+    the store, and only results finished after it started waiting, so a published result never
+    outlives the flight that produced it as a cache. Keys are spread over a fixed set of
+    `lock_files` lock files, reused by every call, so the folder never grows.
+
+    Attributes:
+        lock_dir (str): Folder for the lock files, None coalesces threads only.
+        store (DiskCache): Shared store where leaders publish results for other processes.
+        ttl (int): Seconds an unread published result is kept in `store`.
+        lock_files (int): Number of lock files the keys are spread over.
+        publish (callable): Tells whether a result can be shared with other processes.
+            Defaults to sharing every result.
+    """
+    def __init__(self, lock_dir = None, store = None, ttl = 30, lock_files = 4096, publish = None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.store = store
+        self.ttl = ttl
+        self.lock_files = lock_files
+        self.publish = publish or (lambda result: True)
+        self._lock = threading.Lock()
+        self._calls = {}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, function):
+        """
+        Runs `function` once for all concurrent callers using the same `key`.
+
+        Args:
+            key (str): Identifier of the upstream call, usually built with `DiskCache.make_key`.
+            function (callable): Zero-argument callable performing the upstream call.
+
+        Returns:
+            The result of `function`, shared by every caller. Exceptions are shared too.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, function)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+            if call.waiters:
+                logger.log_debug(
+                    message = f"Shared one upstream call with {call.waiters} waiting callers",
+                    module_name = "SingleFlight.do"
+                )
+
+        return call.result
+
+    def _run(self, key, function):
+        if not self.lock_dir:
+            return function()
+
+        waiting_since = time.time()
+        with self._file_lock(key) as contended:
+            if contended and self.store is not None:
+                published = self.store.get(key)
+                # Results of earlier flights are stale, this process did not wait for them
+                if isinstance(published, dict) and published.get("finished", 0) >= waiting_since:
+                    return published["result"]
+
+            result = function()
+
+            if self.store is not None and self.publish(result):
+                self.store.set(key, {"finished": time.time(), "result": result}, self.ttl)
+            return result
+
+    def _stripe(self, key):
+        return int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % self.lock_files
+
+    @contextmanager
+    def _file_lock(self, key):
+        """
+        Holds the lock file of `key`, yields whether another process was holding it.
+        """
+        path = os.path.join(self.lock_dir, f"{self._stripe(key):04x}.lock")
+        with open(path, "a") as file:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                contended = False
+            except BlockingIOError:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+                contended = True
+            try:
+                yield contended
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
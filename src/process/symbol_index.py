@@ -0,0 +1,332 @@
+import os
+import mmap
+import time
+import shutil
+import threading
+from array import array
+from dotenv import load_dotenv
+
+from process.logger import Logger
+from process.routing_cache import normalize, similarity
+
+load_dotenv()
+
+logger = Logger()
+
+# Dropped from company names so "Apple" matches "Apple Inc."
+CORPORATE_SUFFIXES = frozenset("""
+    inc incorporated corp corporation co company ltd limited plc llc lp sa ab ag nv se spa
+    cv sab holdings holding group class adr
+""".split())
+
+MAJOR_EXCHANGES = ("NASDAQ", "NYSE", "AMEX")
+
+
+def normalize_name(name):
+    """
+    Normalizes a company name for the name index.
+    """
+    return " ".join(token for token in normalize(name).split() if token not in CORPORATE_SUFFIXES)
+
+
+class SortedLines:
+    """
+    Memory-mapped text file of sorted, tab separated lines.
+
+    The byte offset of every line is stored next to the file (`<path>.off`) when the index is
+    built, so loading is two mmaps and lookups are binary searches on the first field, which
+    works as a flattened prefix trie.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self._offsets = array("q")
+        with open(f"{path}.off", "rb") as file:
+            self._offsets.frombytes(file.read())
+
+    @staticmethod
+    def write(path, lines):
+        offsets = array("q")
+        position = 0
+        with open(path, "wb") as file:
+            for line in sorted(set(lines)):
+                data = (line + "\n").encode("utf-8")
+                offsets.append(position)
+                file.write(data)
+                position += len(data)
+        offsets.append(position)
+        with open(f"{path}.off", "wb") as file:
+            offsets.tofile(file)
+
+    def __len__(self):
+        return max(0, len(self._offsets) - 1)
+
+    def fields(self, index):
+        line = self._map[self._offsets[index]:self._offsets[index + 1] - 1]
+        return line.decode("utf-8").split("\t")
+
+    def _lower_bound(self, key):
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.fields(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, key):
+        """
+        Returns the fields of the first line whose first field equals `key`, or None.
+        """
+        index = self._lower_bound(key)
+        if index < len(self):
+            fields = self.fields(index)
+            if fields[0] == key:
+                return fields
+        return None
+
+    def prefix(self, prefix, limit = None):
+        """
+        Yields the fields of the lines whose first field starts with `prefix`.
+        """
+        index = self._lower_bound(prefix)
+        count = 0
+        while index < len(self) and (limit is None or count < limit):
+            fields = self.fields(index)
+            if not fields[0].startswith(prefix):
+                break
+            yield fields
+            index += 1
+            count += 1
+
+
+class SymbolIndex:
+    """
+    Local index of the listed companies built from the Financial Modeling Prep symbol lists.
+
+    Tickers are resolved with a binary search over a memory-mapped sorted file, company names
+    with a token prefix index plus trigram similarity. The index is stored in versioned folders
+    under `directory`, the 'CURRENT' file points to the active one and is replaced atomically
+    when a refresh finishes, so readers never see a partial index.
+
+    Attributes:
+        directory (str): Folder where the index versions are stored.
+        max_age (float): Seconds after which the index is refreshed in the background.
+    """
+    def __init__(self, directory, max_age = 7 * 24 * 60 * 60):
+        self.directory = directory
+        self.max_age = max_age
+        self._tickers = None
+        self._names = None
+        self._built_at = None
+        self._api_client = None
+        self._refreshing = threading.Lock()
+        self.load()
+
+    @property
+    def available(self):
+        return self._tickers is not None
+
+    def load(self):
+        """
+        Loads the current index version if there is one.
+        """
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), "r", encoding="utf-8") as file:
+                version = file.read().strip()
+            folder = os.path.join(self.directory, version)
+            self._tickers = SortedLines(os.path.join(folder, "tickers.txt"))
+            self._names = SortedLines(os.path.join(folder, "names.txt"))
+            self._built_at = float(version)
+        except (FileNotFoundError, ValueError):
+            return False
+
+        logger.log_info(
+            message = f"Symbol index loaded with {len(self._tickers)} tickers",
+            module_name = "SymbolIndex.load"
+        )
+        return True
+
+    def build(self, stock_list, statement_symbols):
+        """
+        Writes a new index version and makes it the current one.
+
+        Args:
+            stock_list (list): Records of the 'stock-list' endpoint (symbol, name, exchangeShortName).
+            statement_symbols (list): Tickers of the 'financial-statement-symbol-lists' endpoint.
+        """
+        with_statements = set(statement_symbols)
+        tickers = []
+        names = []
+        for record in stock_list:
+            symbol = (record.get("symbol") or "").strip().upper()
+            name = (record.get("name") or "").replace("\t", " ").strip()
+            if not symbol or "\t" in symbol:
+                continue
+            exchange = record.get("exchangeShortName") or record.get("exchange") or ""
+            tickers.append(f"{symbol}\t{exchange}\t{name}\t{int(symbol in with_statements)}")
+            for token in set(normalize_name(name).split()):
+                if len(token) > 1:
+                    names.append(f"{token}\t{symbol}")
+
+        version = f"{time.time():.0f}"
+        folder = os.path.join(self.directory, version)
+        os.makedirs(folder, exist_ok=True)
+        SortedLines.write(os.path.join(folder, "tickers.txt"), tickers)
+        SortedLines.write(os.path.join(folder, "names.txt"), names)
+
+        pointer = os.path.join(self.directory, "CURRENT.tmp")
+        with open(pointer, "w", encoding="utf-8") as file:
+            file.write(version)
+        os.replace(pointer, os.path.join(self.directory, "CURRENT"))
+
+        # Keep the previous version for processes that still have it mapped
+        versions = sorted((entry for entry in os.listdir(self.directory) if entry.isdigit()), key=int)
+        for old in versions[:-2]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+        self.load()
+
+    def refresh(self, api_client):
+        """
+        Downloads the symbol lists through `api_client` and rebuilds the index.
+        """
+        responses = api_client.get_endpoints_data(
+            ["stock-list", "financial-statement-symbol-lists"], None, None, None, None, None, None, None
+        )
+        self.build(responses["stock-list"], responses["financial-statement-symbol-lists"])
+
+    def ensure_fresh(self, api_client):
+        """
+        Builds the index if missing (blocking), or refreshes it in the background when older than `max_age`.
+        Failures are logged and leave the current index, if any, in place. The client is kept
+        so later searches refresh a long lived index too.
+        """
+        self._api_client = api_client
+        if self.available and time.time() - self._built_at < self.max_age:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh(api_client)
+            except Exception as error:
+                logger.log_warning(
+                    message = f"Symbol index refresh failed: {error}",
+                    module_name = "SymbolIndex.ensure_fresh"
+                )
+            finally:
+                self._refreshing.release()
+
+        if self.available:
+            threading.Thread(target=run, daemon=True).start()
+        else:
+            run()
+
+    def _check_age(self):
+        """
+        Refreshes an index older than `max_age` in the background, after picking up a newer
+        version built by another process. Only compares timestamps when the index is fresh.
+        """
+        if not self.available or self._api_client is None or time.time() - self._built_at < self.max_age:
+            return
+        if self.load() and time.time() - self._built_at < self.max_age:
+            return
+        self.ensure_fresh(self._api_client)
+
+    def _entry(self, fields):
+        symbol, exchange, name, has_statements = fields
+        return {"symbol": symbol, "exchange": exchange, "name": name, "has_statements": has_statements == "1"}
+
+    def lookup(self, ticker):
+        """
+        Returns the entry of `ticker` ({symbol, exchange, name, has_statements}) or None.
+        """
+        if not self.available or not ticker:
+            return None
+        fields = self._tickers.find(ticker.strip().upper())
+        return self._entry(fields) if fields else None
+
+    def prefix(self, prefix, limit = 10):
+        """
+        Returns the entries whose ticker starts with `prefix`.
+        """
+        if not self.available:
+            return []
+        return [self._entry(fields) for fields in self._tickers.prefix(prefix.strip().upper(), limit)]
+
+    def search(self, name, limit = 5, max_candidates = 2000):
+        """
+        Fuzzy search of a company name.
+
+        Returns:
+            list: (score, entry) tuples sorted by score, companies with financial statements
+                and listed in a major exchange first on ties.
+        """
+        self._check_age()
+        if not self.available:
+            return []
+        query = normalize_name(name)
+        candidates = set()
+        for token in query.split():
+            # Whole word first, shorter prefixes only when it is not in the index, so a common
+            # prefix ("ban") never crowds out the company out of `max_candidates`
+            matches = list(self._names.prefix(f"{token}\t", max_candidates))
+            length = len(token)
+            while not matches and length >= 3:
+                matches = list(self._names.prefix(token[:length], max_candidates))
+                length -= 1
+            candidates.update(symbol for _, symbol in matches)
+
+        results = []
+        for symbol in candidates:
+            entry = self.lookup(symbol)
+            if entry is None:
+                continue
+            score = similarity(query, normalize_name(entry["name"]))
+            results.append((score, entry["has_statements"], entry["exchange"] in MAJOR_EXCHANGES, entry))
+        results.sort(key=lambda result: result[:3], reverse=True)
+        return [(score, entry) for score, _, _, entry in results[:limit]]
+
+    def validate(self, routing_result, min_score = 0.8):
+        """
+        Checks the ticker of a routing result and fixes it when possible.
+
+        A known ticker gets its exchange from the index. An unknown ticker is replaced by the
+        best match of the company name when its score reaches `min_score`.
+
+        Returns:
+            dict: The routing result, corrected in place.
+        """
+        self._check_age()
+        if not self.available or "Error" in routing_result:
+            return routing_result
+
+        entry = self.lookup(routing_result.get("ticker"))
+        if entry is None:
+            matches = self.search(routing_result.get("empresa") or "", limit=1)
+            if matches and matches[0][0] >= min_score:
+                entry = matches[0][1]
+                logger.log_warning(
+                    message = f"Ticker '{routing_result.get('ticker')}' not found, using {entry['symbol']} for '{routing_result.get('empresa')}'",
+                    module_name = "SymbolIndex.validate"
+                )
+        if entry is None:
+            logger.log_warning(
+                message = f"Ticker '{routing_result.get('ticker')}' could not be validated",
+                module_name = "SymbolIndex.validate"
+            )
+            return routing_result
+
+        routing_result["ticker"] = entry["symbol"]
+        routing_result["exchange"] = entry["exchange"] or routing_result.get("exchange")
+        return routing_result
+
+
+# Shared by every session, resolves and validates the tickers given by the routers
+symbol_index = SymbolIndex(
+    directory = os.getenv("SYMBOL_INDEX_DIR", os.path.join(os.getcwd(), "data", "cache", "symbols")),
+    max_age = float(os.getenv("SYMBOL_INDEX_MAX_AGE_DAYS", 7)) * 24 * 60 * 60
+)
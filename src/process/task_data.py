@@ -0,0 +1,152 @@
+import os
+import re
+from functools import lru_cache
+from dotenv import load_dotenv
+from tiktoken import encoding_for_model
+
+from process.columnar import ColumnarTable, as_columnar
+from process.endpoint import ENDPOINT_REGISTRY
+from process.logger import Logger
+
+load_dotenv()
+
+logger = Logger()
+
+SCALES = ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K"))
+
+UNITS_LEGEND = "units: K=thousand M=million B=billion T=trillion"
+
+SCALED_NUMBER = re.compile(r"\d\.\d\d[KMBT]\b")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model = "gpt-4o"):
+    """
+    Returns the tiktoken encoding of `model`, loaded once per process.
+    """
+    return encoding_for_model(model)
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text))
+
+
+def format_value(value):
+    """
+    Renders a value for a compact table: large numbers scaled (383.29B), the rest rounded
+    to 4 significant digits, None as an empty cell.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        for scale, suffix in SCALES:
+            if abs(value) >= scale:
+                return f"{value / scale:.2f}{suffix}"
+        if isinstance(value, int):
+            return str(value)
+        return f"{value:.4g}"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def render_table(table, rows = None):
+    """
+    Renders a ColumnarTable with one header row and '|' separated cells.
+    Columns with the same value in every row are written once as 'key=value' before the table.
+
+    Args:
+        table (ColumnarTable): Records to render.
+        rows (int, optional): Only the first `rows` records are rendered.
+
+    Returns:
+        str: The compact table.
+    """
+    table = table.slice(0, rows)
+    constants, varying = [], []
+    for field in table.fields:
+        column = table.column(field)
+        if all(value == column[0] for value in column):
+            constants.append(f"{field}={format_value(column[0])}")
+        else:
+            varying.append(field)
+
+    lines = ["; ".join(constants)] if constants else []
+    if varying:
+        lines.append("|".join(varying))
+        columns = [table.column(field) for field in varying]
+        for index in range(len(table)):
+            lines.append("|".join(format_value(column[index]) for column in columns))
+    return "\n".join(lines)
+
+
+class TaskDataSerializer:
+    """
+    Renders the endpoint data of an agent task as compact tables within a token budget.
+
+    Each endpoint becomes a table with a single header row, rounded numbers and scaled units
+    instead of the Python repr of its records. When the agent data exceeds `token_budget`
+    (measured with tiktoken), the most recent periods are kept and the oldest ones dropped,
+    starting with the endpoint that uses the most tokens.
+
+    Attributes:
+        token_budget (int): Maximum tokens of the data of one agent task.
+    """
+    def __init__(self, token_budget = None):
+        self.token_budget = token_budget or int(os.getenv("AGENT_DATA_TOKEN_BUDGET", 3000))
+
+    def _newest_first(self, endpoint, table):
+        spec = ENDPOINT_REGISTRY.get(endpoint)
+        period_key = spec.schema.get("period_key") if spec else None
+        if not period_key or period_key not in table.columns:
+            return table
+        column = table.column(period_key)
+        order = sorted(range(len(table)), key=lambda index: column[index] or "", reverse=True)
+        return ColumnarTable.from_records([table[index] for index in order])
+
+    def serialize(self, agent, data):
+        """
+        Args:
+            agent (str): Agent name, used in the log.
+            data (dict): Endpoint name to its (cleaned) response.
+
+        Returns:
+            dict: Endpoint name to the compact text to insert in the task description.
+        """
+        tables = {}
+        texts = {}
+        for endpoint, payload in data.items():
+            payload = as_columnar(payload)
+            if isinstance(payload, ColumnarTable) and len(payload):
+                tables[endpoint] = self._newest_first(endpoint, payload)
+                texts[endpoint] = render_table(tables[endpoint])
+            else:
+                texts[endpoint] = str(payload)
+
+        counts = {endpoint: count_tokens(text) for endpoint, text in texts.items()}
+        rows = {endpoint: len(table) for endpoint, table in tables.items()}
+        total = sum(counts.values())
+        while total > self.token_budget:
+            trimmable = [endpoint for endpoint in tables if rows[endpoint] > 1]
+            if not trimmable:
+                break
+            endpoint = max(trimmable, key=lambda name: counts[name])
+            # Shrink proportionally to the excess, at least one period at a time
+            target = int(rows[endpoint] * (1 - (total - self.token_budget) / counts[endpoint]))
+            rows[endpoint] = max(1, min(rows[endpoint] - 1, target))
+            texts[endpoint] = render_table(tables[endpoint], rows[endpoint])
+            total -= counts[endpoint]
+            counts[endpoint] = count_tokens(texts[endpoint])
+            total += counts[endpoint]
+
+        if any(SCALED_NUMBER.search(text) for text in texts.values()):
+            first = next(iter(texts))
+            texts[first] = f"{UNITS_LEGEND}\n{texts[first]}"
+            total += count_tokens(UNITS_LEGEND)
+
+        before = sum(count_tokens(str(payload)) for payload in data.values())
+        logger.log_info(
+            message = f"{agent} task data: {before} -> {total} tokens, periods kept {rows}",
+            module_name = "TaskDataSerializer.serialize"
+        )
+        return texts
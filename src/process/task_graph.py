@@ -0,0 +1,95 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from process.logger import Logger
+
+logger = Logger()
+
+
+class TaskGraph:
+    """
+    Directed acyclic graph of named tasks executed by a thread pool.
+
+    A task starts as soon as all of its dependencies have finished and receives their results
+    as positional arguments, in the order the dependencies were given. Tasks must be added
+    after their dependencies, which keeps the graph acyclic. Each task runs in a copy of the
+    caller's context, so `current_metrics()` keeps working inside the tasks.
+
+    Attributes:
+        max_workers (int): Maximum number of tasks running at the same time.
+    """
+    def __init__(self, max_workers = 8):
+        self.max_workers = max_workers
+        self._tasks = {}
+
+    def add(self, name, function, dependencies = (), timed = True):
+        """
+        Adds a task to the graph.
+
+        Args:
+            name (str): Unique task name, also used as the metrics stage name.
+            function (callable): Called with the results of `dependencies`.
+            dependencies (list): Names of the tasks that must finish first.
+            timed (bool): Whether the task is timed as a stage, False for tasks that record
+                their own metrics.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Task '{name}' already exists")
+        missing = [dependency for dependency in dependencies if dependency not in self._tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {', '.join(missing)}")
+        self._tasks[name] = (function, tuple(dependencies), timed)
+        return name
+
+    def _execute(self, name, metrics, args):
+        function, _, timed = self._tasks[name]
+        if metrics is None or not timed:
+            return function(*args)
+        with metrics.stage(name):
+            return function(*args)
+
+    def run(self, metrics = None):
+        """
+        Runs every task, the ones whose dependencies are done in parallel.
+
+        Args:
+            metrics (RequestMetrics, optional): Each task is timed as a stage named after it.
+
+        Returns:
+            dict: Task name to its result.
+
+        Raises:
+            Exception: The first error raised by a task, after the running tasks finish.
+                Tasks that were not started yet are skipped.
+        """
+        results = {}
+        waiting = {name: set(dependencies) for name, (_, dependencies, _) in self._tasks.items()}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit_ready():
+                for name in [name for name, dependencies in waiting.items() if not dependencies]:
+                    del waiting[name]
+                    args = [results[dependency] for dependency in self._tasks[name][1]]
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, self._execute, name, metrics, args)] = name
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        logger.log_error(
+                            message = f"Task '{name}' failed: {error}",
+                            module_name = "TaskGraph.run"
+                        )
+                        wait(running)
+                        raise error
+                    results[name] = future.result()
+                    for dependencies in waiting.values():
+                        dependencies.discard(name)
+                submit_ready()
+
+        return results
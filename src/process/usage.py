@@ -0,0 +1,212 @@
+import os
+import json
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from dotenv import load_dotenv
+
+from process.logger import Logger
+from process.metrics import current_metrics
+
+load_dotenv()
+
+logger = Logger()
+
+# Usage of the CrewAI LLM calls of the crew running in this context, see `collect_task_usage`
+_task_usage = ContextVar("task_usage", default=None)
+
+
+def collect_task_usage():
+    """
+    Starts collecting the usage of the CrewAI LLM calls made in the current context.
+
+    Every crew collects its own usage, taken from the response of each of its calls, so crews
+    running at the same time (parallel agents, batch workers, sessions) never mix their tokens.
+
+    Returns:
+        dict: Calls, prompt, completion and cached tokens, updated as the calls finish.
+    """
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    _task_usage.set(usage)
+    return usage
+
+
+def add_task_usage(usage):
+    """
+    Adds the `usage` object of one LLM response to the usage collected in the current context.
+    """
+    collected = _task_usage.get()
+    if collected is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    collected["calls"] += 1
+    collected["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+    collected["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+    collected["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+
+
+class UsageLedger:
+    """
+    Token usage and cost of every LLM call of the process.
+
+    Each call is attributed to the request, stage and agent it belongs to (taken from the
+    current RequestMetrics when not given), added to the request metrics and appended to a
+    JSONL log so spend and latency can be aggregated over time with `summarize`.
+
+    Attributes:
+        path (str): JSONL file where every call is appended, None to keep it in memory only.
+        prices (dict): USD per 1K 'prompt', 'cached' (prompt tokens served from cache) and 'completion' tokens.
+        totals (dict): Stage name to the usage aggregated since the process started.
+    """
+    def __init__(self, path = None, prices = None):
+        self.path = path
+        self.prices = prices or {"prompt": 0.0025, "cached": 0.00125, "completion": 0.01}
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def cost(self, prompt_tokens, completion_tokens, cached_tokens = 0):
+        return (
+            (prompt_tokens - cached_tokens) * self.prices["prompt"]
+            + cached_tokens * self.prices["cached"]
+            + completion_tokens * self.prices["completion"]
+        ) / 1000
+
+    def record(self, prompt_tokens, completion_tokens, cached_tokens = 0, seconds = None, stage = None, agent = None, model = None, source = "router", metrics = None):
+        """
+        Records the usage of one LLM call (or of one CrewAI task).
+
+        Args:
+            prompt_tokens (int): Prompt tokens, cached ones included.
+            completion_tokens (int): Completion tokens.
+            cached_tokens (int): Prompt tokens served from the provider prompt cache.
+            seconds (float, optional): Duration of the call.
+            stage (str, optional): Defaults to the stage running in this thread.
+            agent (str, optional): Defaults to the agent in the stage name ('preprocess:Risk' -> 'Risk').
+            model (str, optional): Model or deployment name.
+            source (str): 'router' for LLMRouter calls, 'crew' for CrewAI tasks.
+            metrics (RequestMetrics, optional): Defaults to the `current_metrics()`.
+
+        Returns:
+            dict: The recorded entry.
+        """
+        metrics = metrics or current_metrics()
+        if stage is None:
+            stage = metrics.current_stage() if metrics is not None else "unattributed"
+        if agent is None and ":" in stage:
+            agent = stage.split(":", 1)[1]
+
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "request_id": metrics.request_id if metrics is not None else None,
+            "stage": stage,
+            "agent": agent,
+            "source": source,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_fraction": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "seconds": seconds,
+            "cost": self.cost(prompt_tokens, completion_tokens, cached_tokens)
+        }
+
+        logger.log_debug(
+            message = f"{stage}: {prompt_tokens} prompt tokens, {entry['cached_fraction']:.0%} from the prompt cache",
+            module_name = "UsageLedger.record"
+        )
+        if metrics is not None:
+            metrics.add_usage(entry)
+
+        with self._lock:
+            total = self.totals.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0})
+            total["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost"):
+                total[key] += entry[key]
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                except OSError as error:
+                    logger.log_warning(
+                        message = f"Could not append to the usage log: {error}",
+                        module_name = "UsageLedger.record"
+                    )
+        return entry
+
+    def record_completion(self, usage, seconds = None, model = None):
+        """
+        Records the `usage` object of an OpenAI chat completion (or of its last stream chunk).
+        """
+        if usage is None:
+            return None
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        return self.record(usage.prompt_tokens, usage.completion_tokens, cached, seconds = seconds, model = model)
+
+
+def load(path, since = None):
+    """
+    Reads the entries of a usage log, optionally only the ones newer than `since` (datetime).
+    """
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if since is None or datetime.fromisoformat(entry["timestamp"]) >= since:
+                entries.append(entry)
+    return entries
+
+
+def summarize(entries, by = "stage"):
+    """
+    Aggregates usage entries by 'stage', 'agent', 'request_id', 'model' or 'source'.
+
+    Returns:
+        dict: Group to calls, tokens, cost and seconds, sorted by cost (highest first).
+    """
+    groups = {}
+    for entry in entries:
+        key = entry.get(by) or "-"
+        group = groups.setdefault(key, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0, "seconds": 0.0})
+        group["calls"] += 1
+        for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost"):
+            group[field] += entry.get(field) or 0
+        group["seconds"] += entry.get("seconds") or 0.0
+    return dict(sorted(groups.items(), key=lambda item: -item[1]["cost"]))
+
+
+def cache_latency(entries):
+    """
+    Mean seconds per prompt token of the LLMRouter calls with and without prompt cache hits.
+
+    Returns:
+        dict: 'hit' and 'miss' to {'calls', 'seconds_per_1k_prompt'}.
+    """
+    groups = {"hit": [0, 0.0, 0], "miss": [0, 0.0, 0]}
+    for entry in entries:
+        if entry.get("source") != "router" or not entry.get("seconds") or not entry.get("prompt_tokens"):
+            continue
+        group = groups["hit" if entry.get("cached_tokens") else "miss"]
+        group[0] += 1
+        group[1] += entry["seconds"]
+        group[2] += entry["prompt_tokens"]
+    return {
+        name: {"calls": calls, "seconds_per_1k_prompt": seconds / tokens * 1000 if tokens else None}
+        for name, (calls, seconds, tokens) in groups.items()
+    }
+
+
+# Shared by LLMRouter and the CrewAI agents
+usage_ledger = UsageLedger(
+    path = os.getenv("USAGE_LOG", os.path.join(os.getcwd(), "data", "usage", "usage.jsonl")) or None,
+    prices = {
+        "prompt": float(os.getenv("LLM_PRICE_PROMPT_PER_1K", 0.0025)),
+        "cached": float(os.getenv("LLM_PRICE_CACHED_PER_1K", 0.00125)),
+        "completion": float(os.getenv("LLM_PRICE_COMPLETION_PER_1K", 0.01))
+    }
+)
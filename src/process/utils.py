@@ -1,38 +1,12 @@
+from process.endpoint import AGENT_ENDPOINTS
+
+
 def get_endpoint_mapping(agent_list):
-    selected_agents_endpoints = {}
-
-    endpoints = {
-        "Financial": [
-            "income-statement", 
-            "cash-flow-statement", 
-            "balance-sheet-statement"
-        ],
-        "Accounting": [
-            "cash-flow-statement-growth", 
-            "balance-sheet-statement-growth", 
-            "income-statement-growth"
-        ],
-        "Legal" : [
-            "profile", 
-        ],
-        "Risk": [
-            "rating", 
-            "financial-growth"
-        ],
-        "Investment" : [
-            "stock-price-change", 
-            "historical-market-capitalization", 
-            "discounted-cash-flow"
-        ]
+    return {
+        agent: AGENT_ENDPOINTS[agent]
+        for agent in agent_list
     }
 
-    if agent_list == list(endpoints.keys()):
-        return endpoints
-    else:
-        for agent in agent_list:
-            selected_agents_endpoints[agent] = endpoints[agent]
-        return selected_agents_endpoints
-
 
 def show_example_cleaned(data):
     print(data)
@@ -0,0 +1,59 @@
+"""
+Token usage and cost report of the LLM calls logged by the pipeline.
+
+Every LLMRouter call and CrewAI task is appended to the usage log (USAGE_LOG, by default
+data/usage/usage.jsonl) with its request, stage and agent. This script aggregates it:
+    python src/usage_report.py
+    python src/usage_report.py --by agent --days 7
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Token usage and cost of the multi-agent pipeline")
+    parser.add_argument("--log", default=os.getenv("USAGE_LOG", os.path.join("data", "usage", "usage.jsonl")),
+                        help="Usage log to read")
+    parser.add_argument("--by", choices=["stage", "agent", "request_id", "model", "source"], default="stage",
+                        help="How the calls are grouped")
+    parser.add_argument("--days", type=float, default=None, help="Only the calls of the last N days")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    from process.usage import load, summarize, cache_latency
+
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    entries = load(args.log, since)
+    if not entries:
+        print(f"No usage recorded in {args.log}")
+        return 1
+
+    groups = summarize(entries, by=args.by)
+    total_cost = sum(group["cost"] for group in groups.values()) or 1.0
+    print(f"{args.by:<28}{'calls':>7}{'prompt':>10}{'cached':>9}{'cached %':>10}{'output':>9}{'seconds':>10}{'USD':>10}{'share':>8}")
+    for name, group in groups.items():
+        cached = group["cached_tokens"] / group["prompt_tokens"] if group["prompt_tokens"] else 0.0
+        print(f"{str(name):<28}{group['calls']:>7}{group['prompt_tokens']:>10}{group['cached_tokens']:>9}{cached:>10.1%}"
+              f"{group['completion_tokens']:>9}{group['seconds']:>10.1f}{group['cost']:>10.4f}{group['cost'] / total_cost:>8.1%}")
+
+    latency = cache_latency(entries)
+    if latency["hit"]["calls"] and latency["miss"]["calls"]:
+        print(f"\nRouter calls, seconds per 1K prompt tokens: {latency['hit']['seconds_per_1k_prompt']:.3f} with cache hits "
+              f"({latency['hit']['calls']} calls), {latency['miss']['seconds_per_1k_prompt']:.3f} without ({latency['miss']['calls']} calls)")
+
+    requests = {entry["request_id"] for entry in entries if entry.get("request_id")}
+    print(f"\nCalls: {len(entries)}  Requests: {len(requests)}  Total: USD {sum(group['cost'] for group in groups.values()):.4f}"
+          f"  Per request: USD {sum(group['cost'] for group in groups.values()) / max(1, len(requests)):.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+from process import api_call
+from process.cache import DiskCache
+from process.endpoint import EndpointBuilder
+from process.single_flight import SingleFlight
+
+
+class StubResponse:
+    ok = True
+    status_code = 200
+
+    def __init__(self, payload):
+        self.raw = io.BytesIO(json.dumps(payload).encode("utf-8"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class StubSession:
+    def __init__(self, unknown = ()):
+        self.paths = []
+        self.unknown = unknown
+
+    def get(self, url, **kwargs):
+        path = url.split("/v3/")[1].split("?")[0]
+        self.paths.append(path)
+        endpoint, symbols = path.split("/")
+        return StubResponse([
+            {"symbol": symbol, "endpoint": endpoint} for symbol in symbols.split(",") if symbol not in self.unknown
+        ])
+
+
+class StubScheduler:
+    def execute(self, send):
+        return send(), 0
+
+
+def make_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_call, "single_flight", SingleFlight())
+    client = api_call.FinancialModelingPrepAPI(cache = DiskCache(str(tmp_path)), batch_size = 2)
+    client.session = StubSession()
+    client.scheduler = StubScheduler()
+    return client
+
+
+def test_batch_endpoints_are_split_per_ticker_and_cached(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+
+    results = client.get_batch_endpoints_data(["profile", "income-statement"], ["aapl", "MSFT", "nvda"])
+
+    assert sorted(client.session.paths) == [
+        "income-statement/AAPL", "income-statement/MSFT", "income-statement/NVDA", "profile/AAPL,MSFT", "profile/NVDA"
+    ]
+    assert list(results) == ["AAPL", "MSFT", "NVDA"]
+    assert results["MSFT"]["profile"] == [{"symbol": "MSFT", "endpoint": "profile"}]
+    assert results["NVDA"]["income-statement"] == [{"symbol": "NVDA", "endpoint": "income-statement"}]
+
+    # Every ticker is now cached on its own, as get_endpoints_data stores it
+    client.session = StubSession()
+    assert client.get_batch_endpoints_data(["profile", "income-statement"], ["MSFT", "NVDA"]) == {
+        ticker: results[ticker] for ticker in ("MSFT", "NVDA")
+    }
+    assert client.session.paths == []
+    assert client.get_endpoints_data(["profile"], "AAPL", None, None, None, None, None, None) == {"profile": results["AAPL"]["profile"]}
+    assert client.session.paths == []
+
+
+def test_empty_responses_are_not_cached(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    client.session = StubSession(unknown = ("NEWCO",))
+
+    assert client.get_endpoints_data(["rating"], "NEWCO", None, None, None, None, None, None) == {"rating": []}
+    client.get_endpoints_data(["rating"], "NEWCO", None, None, None, None, None, None)
+
+    assert client.session.paths == ["rating/NEWCO", "rating/NEWCO"]
+
+
+def test_batch_rejects_endpoints_without_ticker(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+
+    with pytest.raises(ValueError):
+        client.get_batch_endpoints_data(["profile", "stock-list"], ["AAPL"])
+
+
+def test_unset_query_parameters_are_not_sent(monkeypatch):
+    monkeypatch.setenv("FMP_API_KEY", "demo")
+    builder = EndpointBuilder()
+
+    url = builder.build("historical-market-capitalization", ticker = "AAPL", limit = 365, _from = None, to = "2024-01-31")
+
+    assert "/historical-market-capitalization/AAPL?" in url
+    assert "&limit=365&to=2024-01-31" in url
+    assert "from=" not in url and "None" not in url
@@ -0,0 +1,29 @@
+from process.columnar import ColumnarTable
+
+
+RECORDS = [
+    {"date": "2024-09-28", "symbol": "AAPL", "revenue": 94930000000, "eps": 0, "ratio": 1.5},
+    {"date": "2024-06-29", "symbol": "AAPL", "revenue": 85777000000, "eps": 1.4, "ratio": 2},
+    {"symbol": "AAPL", "date": "2024-03-30", "eps": 1.53, "ratio": 0.5},
+]
+
+
+def test_str_matches_the_records():
+    table = ColumnarTable.from_records(RECORDS)
+
+    assert str(table) == str(RECORDS)
+    assert table.to_records() == RECORDS
+
+
+def test_missing_keys_and_key_order_survive_drop_select_and_slice():
+    table = ColumnarTable.from_records(RECORDS)
+
+    assert table.drop(["eps"]).to_records() == [
+        {key: value for key, value in record.items() if key != "eps"} for record in RECORDS
+    ]
+    assert table.select(["revenue", "date"]).to_records() == [
+        {"revenue": 94930000000, "date": "2024-09-28"},
+        {"revenue": 85777000000, "date": "2024-06-29"},
+        {"date": "2024-03-30"},
+    ]
+    assert str(table[1:]) == str(RECORDS[1:])
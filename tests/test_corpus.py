@@ -0,0 +1,26 @@
+import json
+
+from process.corpus import load_corpus, percentile
+
+
+def test_load_corpus_accepts_user_input_or_body(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"request_id": "user-001", "user_input": "Financial analysis of Apple"}),
+        "",
+        json.dumps({"title": "Risk", "body": "Risk analysis of Microsoft"}),
+    ]), encoding="utf-8")
+
+    assert load_corpus(str(path)) == [
+        {"request_id": "user-001", "user_input": "Financial analysis of Apple"},
+        {"request_id": "1", "user_input": "Risk analysis of Microsoft"},
+    ]
+
+
+def test_percentile_is_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 50) == 3
+    assert percentile(values, 90) == 5
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) is None
@@ -0,0 +1,58 @@
+import threading
+import contextvars
+from types import SimpleNamespace
+
+import litellm
+
+from process.rate_limit import LLMRateLimiter, throttle_llm
+from process.usage import collect_task_usage
+
+AGENTS = 4
+CALLS = 3
+
+
+class FakeLLM:
+    max_tokens = 10
+
+    def call(self, messages, callbacks = None):
+        return litellm.completion(model = "fake", messages = messages).choices[0].message.content
+
+
+def test_concurrent_crews_keep_their_own_usage(monkeypatch):
+    # Every call waits for the other agents, so all of them are in flight at the same time
+    barrier = threading.Barrier(AGENTS, timeout = 10)
+
+    def completion(model, messages):
+        barrier.wait()
+        return SimpleNamespace(
+            choices = [SimpleNamespace(message = SimpleNamespace(content = "ok"))],
+            usage = SimpleNamespace(prompt_tokens = int(messages[0]["content"]), completion_tokens = 1, prompt_tokens_details = None)
+        )
+
+    monkeypatch.setattr(litellm, "completion", completion)
+    limiter = LLMRateLimiter(tokens_per_minute = 10 ** 6, requests_per_minute = 10 ** 4)
+    llm = throttle_llm(FakeLLM(), limiter)
+    results = {}
+
+    def run_agent(agent):
+        usage = collect_task_usage()
+        for _ in range(CALLS):
+            llm.call([{"role": "user", "content": str(agent * 100)}])
+        results[agent] = dict(usage)
+
+    threads = [
+        threading.Thread(target = contextvars.copy_context().run, args = (run_agent, agent))
+        for agent in range(1, AGENTS + 1)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for agent in range(1, AGENTS + 1):
+        assert results[agent] == {
+            "calls": CALLS,
+            "prompt_tokens": CALLS * agent * 100,
+            "completion_tokens": CALLS,
+            "cached_tokens": 0
+        }
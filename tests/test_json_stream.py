@@ -0,0 +1,39 @@
+import io
+import json
+
+import pytest
+
+from process import json_stream
+from process.json_stream import parse_projected
+
+
+def stream(document):
+    return io.BytesIO(json.dumps(document).encode("utf-8"))
+
+
+@pytest.fixture(params = ["ijson", "json"])
+def parser(request, monkeypatch):
+    if request.param == "ijson":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(json_stream, "ijson", None)
+    return parse_projected
+
+
+def test_keys_are_compared_whole_not_by_dotted_prefix(parser):
+    assert parser(stream({"a.b": 1, "a": 2}), discard = ("a",)) == {"a.b": 1}
+    assert parser(stream([{"a.b": 1, "a": {"b": 2}}]), discard = ("a",)) == [{"a.b": 1}]
+
+
+def test_only_record_keys_are_dropped(parser):
+    document = [
+        {"date": "2024", "link": "https://sec.gov", "segments": [{"link": "kept", "value": 1}]},
+        {"link": {"nested": [1, 2]}, "date": "2023"},
+        ["link", 3],
+    ]
+
+    assert parser(stream(document), discard = ("link",)) == [
+        {"date": "2024", "segments": [{"link": "kept", "value": 1}]},
+        {"date": "2023"},
+        ["link", 3],
+    ]
@@ -0,0 +1,27 @@
+from process.metrics import RequestMetrics
+from process.multi_agents import MultiAgentSystem
+
+
+class FakePreprocess:
+    def clean_api_response(self, agents, api_responses):
+        return {"quote": ["price", "volume"]}
+
+    def llm_preprocess(self, key_cleanup, llm_router):
+        return {"quote": ["volume"]}
+
+    def json_key_cleanup(self, keys_to_discard, api_responses):
+        return {"quote": [{"price": 1.0}]}
+
+
+def test_preprocess_agent_data_times_each_step():
+    system = MultiAgentSystem.__new__(MultiAgentSystem)
+    system.preprocess = FakePreprocess()
+    system.llm_router = None
+    metrics = RequestMetrics()
+
+    with metrics.activate():
+        data = system.preprocess_agent_data("Risk", {"quote": [{"price": 1.0, "volume": 10}]})
+
+    assert data == {"quote": [{"price": 1.0}]}
+    for stage in ("key_extraction:Risk", "llm_preprocess:Risk", "key_cleanup:Risk"):
+        assert stage in metrics.stages
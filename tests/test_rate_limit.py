@@ -0,0 +1,115 @@
+import time
+import threading
+
+import pytest
+
+from process.rate_limit import TokenBucket, RequestScheduler, LLMRateLimiter
+
+
+class StubResponse:
+    def __init__(self, status_code, headers = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("Rate limit reached")
+        self.response = StubResponse(429, {"retry-after": retry_after})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_bucket_serves_callers_in_arrival_order():
+    bucket = TokenBucket(rate = 10, capacity = 2)
+    bucket.acquire(2)
+    served = []
+
+    def take(name, tokens):
+        bucket.acquire(tokens)
+        served.append(name)
+
+    # The small request would fit first, it still waits for the large one queued before it
+    large = threading.Thread(target = take, args = ("large", 2))
+    large.start()
+    time.sleep(0.02)
+    small = threading.Thread(target = take, args = ("small", 0.5))
+    small.start()
+    large.join(5)
+    small.join(5)
+
+    assert served == ["large", "small"]
+
+
+def test_adjust_below_zero_makes_the_next_caller_wait_for_the_debt():
+    bucket = TokenBucket(rate = 10, capacity = 1)
+    bucket.acquire(1)
+    bucket.adjust(tokens = -1)
+
+    assert bucket.acquire(1) >= 0.15
+
+
+def test_scheduler_retries_with_retry_after_and_closes_retried_responses(sleeps):
+    responses = [StubResponse(429, {"Retry-After": "2"}), StubResponse(503), StubResponse(200)]
+    sent = iter(responses)
+    scheduler = RequestScheduler(calls_per_minute = 6000, max_retries = 4, backoff_base = 1.0)
+
+    response, _ = scheduler.execute(lambda: next(sent))
+
+    assert response is responses[2] and not response.closed
+    assert responses[0].closed and responses[1].closed
+    assert sleeps[0] == 2.0
+    assert 0.5 <= sleeps[1] <= 2.0
+    assert scheduler.stats["retries"] == 2
+
+
+def test_scheduler_returns_the_last_response_after_max_retries(sleeps):
+    scheduler = RequestScheduler(calls_per_minute = 6000, max_retries = 1)
+
+    response, _ = scheduler.execute(lambda: StubResponse(503))
+
+    assert response.status_code == 503 and not response.closed
+    assert len(sleeps) == 1
+
+
+def test_llm_rate_limit_drains_the_budget_for_retry_after():
+    limiter = LLMRateLimiter(tokens_per_minute = 6000, requests_per_minute = 600)
+    answers = iter([RateLimitError("0.2"), "report"])
+
+    def send():
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    start = time.monotonic()
+    assert limiter.call(send, estimated = 10) == "report"
+
+    # The retry, like any other caller, waited until Retry-After had passed
+    assert time.monotonic() - start >= 0.15
+    assert limiter.stats["rate_limited"] == 1
+    assert limiter.stats["calls"] == 2
+
+
+def test_llm_errors_other_than_rate_limits_are_not_retried():
+    limiter = LLMRateLimiter(tokens_per_minute = 6000, requests_per_minute = 600)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise ValueError("Invalid request")
+
+    with pytest.raises(ValueError):
+        limiter.call(send, estimated = 10)
+    assert calls == [1]
@@ -0,0 +1,34 @@
+from process.cache import DiskCache
+from process.report_cache import ReportCache
+
+
+def make_cache(tmp_path):
+    return ReportCache(
+        store = DiskCache(str(tmp_path / "reports")),
+        generations = DiskCache(str(tmp_path / "reports" / "generations"), max_bytes = float("inf"))
+    )
+
+
+def test_invalidating_every_ticker_removes_reports_of_other_processes(tmp_path):
+    # Opened before the report is written, its index does not know the entry
+    other = make_cache(tmp_path)
+    writer = make_cache(tmp_path)
+    key = writer.key("AAPL", ["Risk"], "gpt-4o", "v1", {"Risk": []})
+    writer.set(key, "report")
+
+    other.invalidate()
+
+    assert writer.get(key) is None
+
+
+def test_invalidating_a_ticker_keeps_the_others(tmp_path):
+    cache = make_cache(tmp_path)
+    apple = cache.key("AAPL", ["Risk"], "gpt-4o", "v1", {"Risk": []})
+    microsoft = cache.key("MSFT", ["Risk"], "gpt-4o", "v1", {"Risk": []})
+    cache.set(apple, "apple")
+    cache.set(microsoft, "microsoft")
+
+    cache.invalidate("AAPL")
+
+    assert cache.get(cache.key("AAPL", ["Risk"], "gpt-4o", "v1", {"Risk": []})) is None
+    assert cache.get(cache.key("MSFT", ["Risk"], "gpt-4o", "v1", {"Risk": []})) == "microsoft"
@@ -0,0 +1,55 @@
+from process.routing_cache import RoutingCache, normalize, similarity
+
+APPLE = {"agentes": ["Financial"], "empresa": "Apple", "ticker": "AAPL", "exchange": "NASDAQ"}
+
+
+def cache_with(user_input, result = APPLE, **kwargs):
+    cache = RoutingCache(**kwargs)
+    cache.add(user_input, result)
+    return cache
+
+
+def test_case_accents_punctuation_and_stop_words_are_exact_hits():
+    cache = cache_with("Análisis financiero de Apple")
+
+    assert cache.lookup("¿analisis FINANCIERO para apple?") == APPLE
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_typos_and_inflections_are_fuzzy_hits():
+    cache = cache_with("Análisis financiero de Apple")
+
+    assert cache.lookup("Analisis financieros de Apple") == APPLE
+    assert cache_with("Financial analysis of Microsoft").lookup("Financial analysis of Microsft") == APPLE
+
+
+def test_inputs_below_the_threshold_miss():
+    cache = cache_with("Financial and risk analysis of Apple")
+
+    assert similarity(normalize("Financial and risk analysis of Apple"), normalize("Financial analysis of Apple")) < 0.8
+    assert cache.lookup("Financial analysis of Apple") is None
+    assert cache.stats["misses"] == 1
+
+
+def test_a_company_with_a_similar_name_never_reuses_the_route():
+    # Above the trigram threshold, only the word guard tells both companies apart
+    cache = cache_with("Financial analysis of Meta Platforms")
+
+    assert similarity(normalize("Financial analysis of Meta Platforms"), normalize("Financial analysis of Beta Platforms")) >= 0.8
+    assert cache.lookup("Financial analysis of Beta Platforms") is None
+
+
+def test_a_shorter_company_name_never_reuses_the_route():
+    hospitality = {"agentes": ["Financial"], "empresa": "Apple Hospitality REIT", "ticker": "APLE", "exchange": "NYSE"}
+
+    # Even with a threshold low enough for the trigrams to match
+    assert cache_with("Apple Hospitality revenue", hospitality, threshold = 0.4).lookup("Apple revenue") is None
+    assert cache_with("Apple revenue", threshold = 0.4).lookup("Apple Hospitality revenue") is None
+
+
+def test_cached_results_are_copies():
+    cache = cache_with("Financial analysis of Apple")
+
+    cache.lookup("Financial analysis of Apple")["ticker"] = "MSFT"
+
+    assert cache.lookup("Financial analysis of Apple")["ticker"] == "AAPL"
@@ -0,0 +1,98 @@
+from process.rule_router import RuleRouter
+from process.symbol_index import SymbolIndex
+
+
+def route(user_input):
+    return RuleRouter().route(user_input)
+
+
+def test_unambiguous_request_is_routed():
+    result, confidence = route("Financial analysis of Apple")
+
+    assert result == {"agentes": ["Financial"], "empresa": "Apple Inc.", "ticker": "AAPL", "exchange": "NASDAQ"}
+    assert confidence == 1.0
+
+
+def test_known_name_inside_another_company_name_is_left_to_the_llm():
+    result, confidence = route("Risk analysis of Apple Hospitality REIT")
+
+    assert result is None
+    assert confidence < 0.9
+
+
+def test_corporate_suffix_after_the_name_is_still_routed():
+    result, _ = route("Risk analysis of Apple Inc.")
+
+    assert result["ticker"] == "AAPL"
+
+
+def test_aliases_match_whole_words_only():
+    result, _ = route("Financial analysis of Pineapple Express")
+
+    assert result is None
+
+
+def test_longest_alias_wins():
+    router = RuleRouter(companies = {
+        "bank": ("Some Bank", "BNK", "NYSE"),
+        "bank america": ("Bank of America Corporation", "BAC", "NYSE"),
+    })
+
+    result, _ = router.route("Risk analysis of Bank of America")
+
+    assert result["ticker"] == "BAC"
+
+
+def test_negated_request_is_left_to_the_llm():
+    result, confidence = route("Apple risk report, no financial analysis")
+
+    assert result is None
+    assert confidence < 0.9
+
+
+def test_several_companies_lower_the_confidence():
+    _, two = route("Financial analysis of Apple and Microsoft")
+    _, three = route("Financial analysis of Apple, Microsoft and Tesla")
+
+    assert two < 0.9
+    assert three < two
+
+
+def test_two_companies_joined_by_a_conjunction_are_left_to_the_llm():
+    result, confidence = route("Financial analysis of Apple and Samsung")
+
+    assert result is None
+    assert confidence < 0.9
+
+
+def test_comparison_is_left_to_the_llm():
+    result, confidence = route("Análisis financiero de Apple vs Samsung")
+
+    assert result is None
+    assert confidence < 0.9
+
+
+def test_lowercase_longer_company_name_is_left_to_the_llm():
+    result, confidence = route("análisis financiero de apple hospitality reit")
+
+    assert result is None
+    assert confidence < 0.9
+
+
+def test_symbol_index_tells_longer_names_from_other_words(tmp_path):
+    index = SymbolIndex(str(tmp_path))
+    index.build([
+        {"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"},
+        {"symbol": "APLE", "name": "Apple Hospitality REIT, Inc.", "exchangeShortName": "NYSE"},
+    ], ["AAPL", "APLE"])
+    router = RuleRouter(symbol_index = index)
+
+    assert router.route("análisis financiero de apple hospitality reit")[0] is None
+    assert router.route("análisis financiero de apple ingresos")[0]["ticker"] == "AAPL"
+
+
+def test_keywords_joined_by_a_conjunction_are_still_routed():
+    result, _ = route("Financial and risk analysis of Apple's business")
+
+    assert result["agentes"] == ["Financial", "Risk"]
+    assert result["ticker"] == "AAPL"
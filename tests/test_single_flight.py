@@ -0,0 +1,69 @@
+import os
+import time
+import fcntl
+import threading
+
+from process.cache import DiskCache
+from process.single_flight import SingleFlight
+
+
+def make_flight(tmp_path, **kwargs):
+    return SingleFlight(lock_dir=str(tmp_path / "locks"), store=DiskCache(str(tmp_path / "store")), **kwargs)
+
+
+def hold_lock(flight, key):
+    path = os.path.join(flight.lock_dir, f"{flight._stripe(key):04x}.lock")
+    file = open(path, "a")
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    return file
+
+
+def test_uncontended_call_ignores_published_results(tmp_path):
+    flight = make_flight(tmp_path)
+    flight.store.set("key", {"finished": time.time(), "result": "old"}, 30)
+
+    assert flight.do("key", lambda: "new") == "new"
+
+
+def test_waiting_process_reads_the_result_of_the_flight_it_waited_for(tmp_path):
+    flight = make_flight(tmp_path)
+    calls = []
+    results = []
+    lock = hold_lock(flight, "key")
+    thread = threading.Thread(target=lambda: results.append(flight.do("key", lambda: calls.append(1) or "own")))
+    thread.start()
+    time.sleep(0.2)
+
+    # The other process finishes its flight and releases the lock
+    flight.store.set("key", {"finished": time.time(), "result": "shared"}, 30)
+    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+    lock.close()
+    thread.join(5)
+
+    assert results == ["shared"]
+    assert calls == []
+
+
+def test_waiting_process_skips_results_of_earlier_flights(tmp_path):
+    flight = make_flight(tmp_path)
+    flight.store.set("key", {"finished": time.time() - 1, "result": "old"}, 30)
+    results = []
+    lock = hold_lock(flight, "key")
+    thread = threading.Thread(target=lambda: results.append(flight.do("key", lambda: "new")))
+    thread.start()
+    time.sleep(0.2)
+    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+    lock.close()
+    thread.join(5)
+
+    assert results == ["new"]
+
+
+def test_rejected_results_are_not_published(tmp_path):
+    flight = make_flight(tmp_path, publish=lambda result: "Error Message" not in result)
+
+    flight.do("error", lambda: {"Error Message": "Invalid API KEY"})
+    flight.do("data", lambda: {"symbol": "AAPL"})
+
+    assert flight.store.get("error") is None
+    assert flight.store.get("data")["result"] == {"symbol": "AAPL"}
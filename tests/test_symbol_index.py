@@ -0,0 +1,64 @@
+import time
+import threading
+
+from process.symbol_index import SymbolIndex
+
+
+def test_search_finds_company_after_common_prefix_cap(tmp_path):
+    # Thousands of "Ban..." companies sort before "Bankwell" in the name index
+    stock_list = [
+        {"symbol": f"BC{index:04d}", "name": f"Banco {index:04d} SA", "exchangeShortName": "NYSE"}
+        for index in range(2500)
+    ]
+    stock_list.append({"symbol": "BWFG", "name": "Bankwell Financial Group, Inc.", "exchangeShortName": "NASDAQ"})
+    index = SymbolIndex(str(tmp_path))
+    index.build(stock_list, ["BWFG"])
+
+    results = index.search("Bankwell", limit=3)
+
+    assert results[0][1]["symbol"] == "BWFG"
+    assert all(score < results[0][0] for score, _ in results[1:])
+
+
+def test_search_falls_back_to_prefix_for_partial_words(tmp_path):
+    index = SymbolIndex(str(tmp_path))
+    index.build([{"symbol": "BWFG", "name": "Bankwell Financial Group, Inc.", "exchangeShortName": "NASDAQ"}], [])
+
+    assert index.search("Bankw", limit=1)[0][1]["symbol"] == "BWFG"
+
+
+class StubClient:
+    def __init__(self):
+        self.refreshed = threading.Event()
+
+    def get_endpoints_data(self, endpoints, *args):
+        self.refreshed.set()
+        return {
+            "stock-list": [{"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"}],
+            "financial-statement-symbol-lists": ["AAPL"]
+        }
+
+
+def test_validate_refreshes_a_stale_index_in_the_background(tmp_path, monkeypatch):
+    index = SymbolIndex(str(tmp_path), max_age=60)
+    index.build([{"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"}], ["AAPL"])
+    client = StubClient()
+    index._api_client = client
+    # An hour later
+    monkeypatch.setattr(time, "time", lambda now = time.time(): now + 3600)
+
+    result = index.validate({"ticker": "AAPL", "empresa": "Apple"})
+
+    assert result["exchange"] == "NASDAQ"
+    assert client.refreshed.wait(5)
+
+
+def test_search_does_not_refresh_a_fresh_index(tmp_path):
+    index = SymbolIndex(str(tmp_path))
+    index.build([{"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"}], ["AAPL"])
+    client = StubClient()
+    index._api_client = client
+
+    index.search("Apple")
+
+    assert not client.refreshed.is_set()
@@ -0,0 +1,79 @@
+import time
+import threading
+import contextvars
+
+import pytest
+
+from process.metrics import RequestMetrics, current_metrics
+from process.task_graph import TaskGraph
+
+
+def test_tasks_start_after_their_dependencies_and_receive_their_results():
+    graph = TaskGraph()
+    order = []
+
+    def task(name, value):
+        def run(*args):
+            order.append(name)
+            return value + sum(args)
+        return run
+
+    graph.add("fetch:Risk", task("fetch:Risk", 1))
+    graph.add("fetch:Legal", task("fetch:Legal", 2))
+    graph.add("preprocess:Risk", task("preprocess:Risk", 10), ["fetch:Risk"])
+    graph.add("report", task("report", 100), ["preprocess:Risk", "fetch:Legal"])
+
+    results = graph.run()
+
+    assert results == {"fetch:Risk": 1, "fetch:Legal": 2, "preprocess:Risk": 11, "report": 113}
+    assert order.index("fetch:Risk") < order.index("preprocess:Risk") < order.index("report")
+    assert order.index("fetch:Legal") < order.index("report")
+
+
+def test_unknown_and_duplicate_tasks_are_rejected():
+    graph = TaskGraph()
+    graph.add("fetch", lambda: None)
+
+    with pytest.raises(ValueError):
+        graph.add("fetch", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("report", lambda data: None, ["preprocess"])
+
+
+def test_first_error_is_raised_after_the_running_tasks_finish():
+    graph = TaskGraph()
+    started = threading.Event()
+    finished = []
+    skipped = []
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        finished.append("slow")
+
+    def fail():
+        started.wait(5)
+        raise RuntimeError("FMP unavailable")
+
+    graph.add("slow", slow)
+    graph.add("fail", fail)
+    graph.add("after", lambda error: skipped.append("after"), ["fail"])
+
+    with pytest.raises(RuntimeError, match="FMP unavailable"):
+        graph.run()
+    assert finished == ["slow"]
+    assert skipped == []
+
+
+def test_tasks_run_in_the_callers_context():
+    request_id = contextvars.ContextVar("request_id")
+    request_id.set("request-1")
+    metrics = RequestMetrics()
+    graph = TaskGraph()
+    graph.add("fetch", lambda: (request_id.get(), current_metrics()))
+
+    with metrics.activate():
+        results = graph.run(metrics)
+
+    assert results["fetch"] == ("request-1", metrics)
+    assert "fetch" in metrics.stages